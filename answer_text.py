@@ -0,0 +1,106 @@
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+import hashlib
+import threading
+import os
+import dotenv
+dotenv.load_dotenv()
+
+from memory_cache import MemoryCache
+
+
+class _AnswerTextParser(HTMLParser):
+    """Single pass over an answer body that splits prose from <code> contents"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.text_parts: List[str] = []
+        self.code_blocks: List[str] = []
+        self._code_parts: List[str] = []
+        self._code_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._code_depth == 0:
+            # Tags separate words, as get_text(separator=' ') would
+            self.text_parts.append(' ')
+        if tag == 'code':
+            self._code_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'code' and self._code_depth:
+            self._code_depth -= 1
+            if self._code_depth == 0:
+                self.code_blocks.append(''.join(self._code_parts))
+                self._code_parts = []
+        if self._code_depth == 0:
+            self.text_parts.append(' ')
+
+    def handle_data(self, data):
+        if self._code_depth:
+            self._code_parts.append(data)
+        else:
+            self.text_parts.append(data)
+
+
+def extract_answer_text(html_content: str) -> Dict:
+    """Plain text (code removed, whitespace collapsed) and the code blocks of an answer body"""
+    parser = _AnswerTextParser()
+    parser.feed(html_content)
+    parser.close()
+    if parser._code_depth:
+        # Unclosed <code> at the end of the body still counts as a block
+        parser.code_blocks.append(''.join(parser._code_parts))
+
+    return {
+        'text': ' '.join(''.join(parser.text_parts).split()),
+        'code_blocks': parser.code_blocks
+    }
+
+
+class AnswerTextExtractor:
+    """Memoizes answer text extraction by answer id so each body is parsed once"""
+
+    def __init__(self,
+                 snippet_chars: int = int(os.getenv('ANSWER_SNIPPET_CHARS', 300)),
+                 max_code_blocks: int = 2,
+                 max_entries: int = int(os.getenv('ANSWER_TEXT_CACHE_ENTRIES', 4096)),
+                 ttl_seconds: float = 24 * 3600):
+
+        self.snippet_chars = snippet_chars
+        self.max_code_blocks = max_code_blocks
+        self.memo = MemoryCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def extract(self, html_content: str, answer_id: Optional[int] = None) -> Dict:
+        """Full extraction for a body, reused while the same answer keeps the same body"""
+        if answer_id is None:
+            return extract_answer_text(html_content)
+
+        # Edited answers keep their id, so a digest of the body guards against stale text
+        digest = hashlib.blake2b(html_content.encode(), digest_size=16).hexdigest()
+        key = f"{answer_id}:{digest}"
+        extracted = self.memo.get(key)
+        if extracted is None:
+            extracted = extract_answer_text(html_content)
+            self.memo.set(key, extracted)
+        return extracted
+
+    def summarize(self, html_content: str, answer_id: Optional[int] = None) -> Dict:
+        """Snippet and leading code blocks stored alongside an answer at ingest time"""
+        extracted = self.extract(html_content, answer_id)
+        return {
+            'snippet': extracted['text'][:self.snippet_chars],
+            'code_blocks': extracted['code_blocks'][:self.max_code_blocks]
+        }
+
+
+_default_extractor = None
+_default_extractor_lock = threading.Lock()
+
+
+def get_default_extractor() -> AnswerTextExtractor:
+    """Return the process-wide AnswerTextExtractor, creating it on first use"""
+    global _default_extractor
+    with _default_extractor_lock:
+        if _default_extractor is None:
+            _default_extractor = AnswerTextExtractor()
+        return _default_extractor
@@ -1,13 +1,30 @@
-from flask import Flask, jsonify, request, send_from_directory, render_template_string
+from flask import Flask, jsonify, request, send_from_directory, render_template_string, Response, stream_with_context
 from flask_cors import CORS
 from reddit_searcher import RedditSearcher
 from stackoverflow_searcher import StackOverflowSearcher
 from mongo_cache import MongoCache
+from async_engine import AsyncSearchEngine
+from rate_limiter import QuotaRateLimiter
+from single_flight import AsyncSingleFlight, SingleFlight
+from circuit_breaker import CircuitBreaker
+from memory_cache import MemoryCache
+from result_query import ResultIndex, SORT_FIELDS, DIRECTIONS, normalize_date, result_fingerprint
+from metrics import get_default_metrics
+from profiler import get_default_profiler, bind_profile
+from email_queue import EmailQueueFullError, get_default_queue
+from email_renderer import get_default_renderer
 import os
-from concurrent.futures import ThreadPoolExecutor
+import json
+import queue
+import asyncio
+import atexit
+import time
+import re
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import smtplib
 import dotenv 
 dotenv.load_dotenv()
 
@@ -16,10 +33,396 @@ app = Flask(__name__)
 CORS(app)
 
 # Initialize components
-reddit_searcher = RedditSearcher()
-stackoverflow_searcher = StackOverflowSearcher()
+metrics = get_default_metrics()
+profiler = get_default_profiler()
+search_engine = AsyncSearchEngine()
+atexit.register(search_engine.close)
+reddit_searcher = RedditSearcher(engine=search_engine)
+stackexchange_limiter = QuotaRateLimiter()
+stackoverflow_searcher = StackOverflowSearcher(
+    engine=search_engine,
+    rate_limiter=stackexchange_limiter
+)
 cache = MongoCache()
-executor = ThreadPoolExecutor(max_workers=2)
+email_queue = get_default_queue()
+email_renderer = get_default_renderer()
+atexit.register(email_queue.close)
+search_flight = SingleFlight()
+# Used only on the search engine loop
+async_search_flight = AsyncSingleFlight()
+
+# Sort orders of recently queried result sets, see /api/results
+result_indexes = MemoryCache(
+    max_entries=int(os.getenv('RESULT_INDEX_MAX_ENTRIES', 128)),
+    ttl_seconds=float(os.getenv('MEMORY_CACHE_TTL_SECONDS', 300))
+)
+
+PLATFORMS = ('reddit', 'stackoverflow')
+
+# Per-platform breakers and deadlines for combined search
+circuit_breakers = {
+    platform: CircuitBreaker(
+        platform,
+        failure_rate_threshold=float(os.getenv('BREAKER_FAILURE_RATE', 0.5)),
+        window_seconds=float(os.getenv('BREAKER_WINDOW_SECONDS', 60)),
+        min_calls=int(os.getenv('BREAKER_MIN_CALLS', 5)),
+        open_seconds=float(os.getenv('BREAKER_OPEN_SECONDS', 30))
+    )
+    for platform in PLATFORMS
+}
+platform_deadlines = {
+    'reddit': float(os.getenv('REDDIT_DEADLINE_SECONDS', 8)),
+    'stackoverflow': float(os.getenv('STACKOVERFLOW_DEADLINE_SECONDS', 12))
+}
+platform_labels = {'reddit': 'Reddit', 'stackoverflow': 'Stack Overflow'}
+
+# Each platform searches on its own pool, so a hung upstream can only tie up
+# its own workers and never queue the other platform's calls behind it
+platform_executors = {
+    platform: ThreadPoolExecutor(
+        max_workers=int(os.getenv('SEARCH_WORKERS_PER_PLATFORM', 4)),
+        thread_name_prefix=f'{platform}-search'
+    )
+    for platform in PLATFORMS
+}
+
+# Batch search fans out on its own pool so bulk jobs never queue behind, or
+# starve, the interactive pools above
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('BATCH_CONCURRENCY', 8)),
+    thread_name_prefix='batch-search'
+)
+batch_platform_slots = {
+    platform: threading.BoundedSemaphore(int(os.getenv('BATCH_PLATFORM_CONCURRENCY', 4)))
+    for platform in PLATFORMS
+}
+# StackExchange calls already go through stackexchange_limiter; Reddit batch
+# fetches get a token bucket of their own
+reddit_batch_limiter = QuotaRateLimiter(
+    rate=float(os.getenv('REDDIT_BATCH_RATE_PER_SECOND', 1)),
+    burst=int(os.getenv('REDDIT_BATCH_BURST', 5)),
+    max_wait=float(os.getenv('REDDIT_BATCH_MAX_WAIT_SECONDS', 30))
+)
+BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', 100))
+BATCH_DEADLINE_SECONDS = float(os.getenv('BATCH_DEADLINE_SECONDS', 60))
+
+# Per-stage durations in a Server-Timing response header, for browser devtools
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() == 'true'
+
+
+@app.before_request
+def start_request_metrics():
+    request.environ['metrics.started'] = time.perf_counter()
+    if SERVER_TIMING:
+        request.environ['metrics.timing_token'] = metrics.start_request_timing()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = request.environ.get('metrics.started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    # Route templates keep label cardinality bounded
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.request_seconds.observe(elapsed, route=route)
+    metrics.responses.inc(route=route, status=str(response.status_code))
+
+    token = request.environ.pop('metrics.timing_token', None)
+    if token is not None:
+        response.headers['Server-Timing'] = metrics.finish_request_timing(token, elapsed)
+    return response
+
+
+def submit_in_context(pool, fn, *args):
+    """Submit to a pool with the caller's context, so worker stages count toward its Server-Timing and profile"""
+    return pool.submit(contextvars.copy_context().run, bind_profile(fn), *args)
+
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+
+@app.before_request
+def start_request_profile():
+    if not profiler.enabled or request.path.startswith('/api/profiles'):
+        return
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    session = profiler.start(route, request.full_path, request.headers.get(PROFILE_HEADER))
+    if session is not None:
+        request.environ['profile.session'] = session
+
+
+@app.after_request
+def finish_request_profile(response):
+    # Streamed bodies are produced after this point, so only their setup is profiled
+    session = request.environ.pop('profile.session', None)
+    if session is not None:
+        response.headers['X-Profile-Id'] = str(profiler.finish(session))
+    return response
+
+
+@app.teardown_request
+def discard_request_profile(error=None):
+    # Requests that failed before after_request still have to stop their profiler
+    session = request.environ.pop('profile.session', None)
+    if session is not None:
+        profiler.finish(session)
+
+
+def serialize(payload):
+    with metrics.stage('serialize'):
+        return jsonify(payload)
+
+
+def platform_unavailable(platform):
+    return {
+        'error': f'{platform_labels[platform]} is temporarily unavailable',
+        'circuit_open': True,
+        'results': []
+    }
+
+
+def platform_timed_out(platform):
+    return {
+        'error': f'{platform_labels[platform]} did not respond within {platform_deadlines[platform]}s',
+        'timed_out': True,
+        'results': []
+    }
+
+
+def met_deadline(platform, started):
+    """Whether an upstream call begun at started finished within its platform deadline"""
+    return time.monotonic() - started <= platform_deadlines[platform]
+
+
+def guarded_search(platform, search):
+    """Run one platform's search behind its circuit breaker"""
+    breaker = circuit_breakers[platform]
+    if not breaker.allow_request():
+        return platform_unavailable(platform)
+
+    # The upstream call records its own outcome, a deadline miss included, once;
+    # requests waiting on it through single-flight never touch the breaker
+    succeeded = None
+    started = time.monotonic()
+    try:
+        results = search()
+        succeeded = not results.get('error') and met_deadline(platform, started)
+        return results
+    except Exception as e:
+        succeeded = False
+        return {'error': f'{platform_labels[platform]} API Error: {str(e)}', 'results': []}
+    finally:
+        breaker.record_outcome(succeeded)
+
+
+def platform_busy(platform):
+    return {
+        'error': f'{platform_labels[platform]} searches are busy, please try again shortly',
+        'busy': True,
+        'results': []
+    }
+
+
+class PlatformCall:
+    """A search on its platform's pool whose deadline runs from when it starts, not when it is queued"""
+
+    def __init__(self, platform, fn, *args):
+        self.platform = platform
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self._running = threading.Event()
+        self.future = submit_in_context(platform_executors[platform], self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        self.started_at = time.monotonic()
+        self._running.set()
+        return fn(*args)
+
+    def result(self):
+        """Result within the platform deadline; the call itself reports a miss to the breaker"""
+        deadline = platform_deadlines[self.platform]
+        if not self._running.wait(max(0, deadline - (time.monotonic() - self.submitted_at))):
+            # Waiting for a worker is our own saturation, not an upstream failure
+            self.future.cancel()
+            return platform_busy(self.platform)
+
+        remaining = deadline - (time.monotonic() - self.started_at)
+        try:
+            return self.future.result(timeout=max(0, remaining))
+        except FutureTimeoutError:
+            return platform_timed_out(self.platform)
+
+
+def cache_loader(cache_params, fetch):
+    """Wrap fetch so that successful results are written to the cache"""
+    def load():
+        results = fetch()
+        # Failed fetches are shared with every waiter but never cached
+        if not results.get('error') and not results.get('errors'):
+            cache.cache_results(results, **cache_params)
+        return results
+
+    return load
+
+
+def incremental_loader(cache_params, refresh, load):
+    """Update a stale entry with only what changed upstream, falling back to a full load"""
+    def run():
+        # The stored entry may hold more results than the request that found it
+        # stale; it is refreshed and written back at its own size
+        base = cache.get_refresh_base(**cache_params)
+        refreshed = refresh(base['results'], base['since'], base['size']) if base else None
+        if refreshed is None:
+            return load()
+        results, reloaded = refreshed
+        if not results.get('error'):
+            # A refresh that searched again in full has brought membership up to date
+            loaded_at = None if reloaded else base['loaded_at']
+            cache.cache_results(results, loaded_at=loaded_at, **cache.sized_params(cache_params, base['size']))
+        return results
+
+    return run
+
+
+def schedule_stale_refresh(cache_params, load, refresh=None):
+    """Replace a stale entry in the background, incrementally when refresh is given"""
+    if refresh is not None:
+        load = incremental_loader(cache_params, refresh, load)
+    cache.schedule_refresh(load, **cache_params)
+
+
+def record_cache_lookup(cache_params, cached_results, is_stale):
+    result = 'miss' if not cached_results else 'stale' if is_stale else 'hit'
+    metrics.cache_lookups.inc(platform=cache_params['platform'], result=result)
+
+
+def lookup_cached(cache_params, load, refresh=None):
+    """Return cached results, scheduling a background refresh when they are stale"""
+    if cache_params['platform'] == 'stackoverflow_summary':
+        # A fresh full entry for the same search already holds every summary
+        # field; callers project away the answers it carries
+        with metrics.stage('cache_lookup', 'stackoverflow'):
+            full_results, full_stale = cache.get_cached_entry(**{**cache_params, 'platform': 'stackoverflow'})
+        if full_results and not full_stale:
+            record_cache_lookup(cache_params, full_results, False)
+            return full_results
+
+    with metrics.stage('cache_lookup', cache_params['platform']):
+        cached_results, is_stale = cache.get_cached_entry(**cache_params)
+    record_cache_lookup(cache_params, cached_results, is_stale)
+    if cached_results and is_stale:
+        schedule_stale_refresh(cache_params, load, refresh)
+    return cached_results
+
+
+def cached_search(cache_params, fetch, refresh=None):
+    """Serve from cache, otherwise run fetch once per cache key and cache the outcome"""
+    load = cache_loader(cache_params, fetch)
+
+    cached_results = lookup_cached(cache_params, load, refresh)
+    if cached_results:
+        return cached_results
+
+    return search_flight.do(cache.request_key(**cache_params), load)
+
+
+def reddit_cache_params(query, sort, time_filter, limit):
+    return {
+        'platform': 'reddit',
+        'query': query,
+        'sort': sort,
+        'time_filter': time_filter,
+        'limit': limit
+    }
+
+
+def stackoverflow_cache_params(query, sort, page, pagesize, tags, summary=False):
+    # Summary listings fetched without answers get their own entries; lookup_cached
+    # prefers a fresh full entry for the same search before going to them
+    return {
+        'platform': 'stackoverflow_summary' if summary else 'stackoverflow',
+        'query': query,
+        'sort': sort,
+        'page': page,
+        'pagesize': pagesize,
+        'tags': tags
+    }
+
+
+def reddit_refresher(query, sort, time_filter, limit):
+    """Incremental refresh for a stale Reddit entry"""
+    return lambda cached, since, size: reddit_searcher.refresh(
+        cached,
+        since,
+        query=query,
+        sort=sort,
+        time_filter=time_filter,
+        limit=size or limit
+    )
+
+
+def stackoverflow_refresher(query, sort, page, pagesize, tags, summary=False):
+    """Incremental refresh for a stale Stack Overflow entry; only full first pages qualify"""
+    if page != 1 or summary:
+        return None
+    return lambda cached, since, size: stackoverflow_searcher.refresh(
+        cached,
+        since,
+        query=query,
+        tags=tags,
+        sort=sort,
+        pagesize=size or pagesize
+    )
+
+
+def combined_refreshers(query, sort, time_filter, limit, summary=False):
+    return {
+        'reddit': reddit_refresher(query, sort, time_filter, limit),
+        'stackoverflow': stackoverflow_refresher(query, sort, 1, limit, None, summary)
+    }
+
+
+def combined_cache_params(query, sort, time_filter, limit, summary=False):
+    """Per-platform cache entries that together make up one /api/search response"""
+    return {
+        'reddit': reddit_cache_params(query, sort, time_filter, limit),
+        'stackoverflow': stackoverflow_cache_params(query, sort, 1, limit, None, summary)
+    }
+
+
+# Bodies left out of list items in ?view=summary; they are loaded on demand
+SUMMARY_OMITTED_FIELDS = ('selftext', 'top_answer')
+
+
+def requested_projection():
+    """(fields, summary) from ?fields=a,b,c and ?view=summary"""
+    fields = {field.strip() for field in request.args.get('fields', '').split(',') if field.strip()}
+    return fields or None, request.args.get('view') == 'summary'
+
+
+def project_results(results, fields, summary):
+    """Copy of a platform response whose items keep only the requested fields"""
+    if not fields and not summary:
+        return results
+
+    projected_items = []
+    for item in results.get('results', []):
+        if fields:
+            # An explicit field list wins over the summary defaults; ids are always kept
+            item = {key: value for key, value in item.items() if key in fields or key == 'id'}
+        else:
+            item = {key: value for key, value in item.items() if key not in SUMMARY_OMITTED_FIELDS}
+        projected_items.append(item)
+    return {**results, 'results': projected_items}
+
+
+def project_combined(combined_results, fields, summary):
+    return {
+        **combined_results,
+        'reddit': project_results(combined_results['reddit'], fields, summary),
+        'stackoverflow': project_results(combined_results['stackoverflow'], fields, summary)
+    }
 
 @app.route('/')
 def index():
@@ -34,35 +437,103 @@ def reddit_search():
         sort = request.args.get('sort', 'relevance')
         time_filter = request.args.get('time', 'month')
         limit = int(request.args.get('limit', 25))
+        fields, summary = requested_projection()
 
         if not query:
             return jsonify({'error': 'Query parameter is required'}), 400
 
-        cache_params = {
-            'platform': 'reddit',
-            'query': query,
-            'sort': sort,
-            'time_filter': time_filter,
-            'limit': limit
-        }
+        cache_params = reddit_cache_params(query, sort, time_filter, limit)
         
-        cached_results = cache.get_cached_results(**cache_params)
-        if cached_results:
-            return jsonify(cached_results)
-
-        results = reddit_searcher.search(
+        results = cached_search(cache_params, lambda: reddit_searcher.search(
             query=query,
             sort=sort,
             time_filter=time_filter,
             limit=limit
-        )
+        ), refresh=reddit_refresher(query, sort, time_filter, limit))
 
-        cache.cache_results(results, **cache_params)
-        return jsonify(results)
+        return serialize(project_results(results, fields, summary))
 
     except Exception as e:
         return jsonify({'error': f'Reddit API Error: {str(e)}'}), 500
 
+REDDIT_PAGES_MAX_RESULTS = int(os.getenv('REDDIT_PAGES_MAX_RESULTS', 1000))
+REDDIT_CURSOR = re.compile(r'^t3_[0-9a-z]+$')
+
+
+@app.route('/api/reddit/search/pages', methods=['GET'])
+def reddit_search_pages():
+    """Deep Reddit search streamed as NDJSON pages, ending with a cursor to continue from"""
+    query = request.args.get('q', '')
+    sort = request.args.get('sort', 'relevance')
+    time_filter = request.args.get('time', 'month')
+    subreddit = request.args.get('subreddit') or None
+    cursor = request.args.get('cursor') or None
+    try:
+        page_size = min(int(request.args.get('page_size', 100)), 100)
+        max_results = min(int(request.args.get('max_results', REDDIT_PAGES_MAX_RESULTS)), REDDIT_PAGES_MAX_RESULTS)
+    except ValueError:
+        return jsonify({'error': 'page_size and max_results must be integers'}), 400
+
+    if not query:
+        return jsonify({'error': 'Query parameter is required'}), 400
+    if page_size < 1 or max_results < 1:
+        return jsonify({'error': 'page_size and max_results must be positive'}), 400
+    if cursor and not REDDIT_CURSOR.match(cursor):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    breaker = circuit_breakers['reddit']
+    if not breaker.allow_request():
+        return jsonify(platform_unavailable('reddit')), 503
+
+    reported = threading.Event()
+
+    def report(succeeded):
+        if not reported.is_set():
+            reported.set()
+            breaker.record_outcome(succeeded)
+
+    def generate():
+        total_results = 0
+        next_cursor = cursor
+        error = None
+        # A client that disconnects mid-stream leaves the upstream's health
+        # unknown, so an aborted stream only frees its probe slot
+        succeeded = None
+        try:
+            for page in reddit_searcher.iter_pages(
+                query=query,
+                subreddit=subreddit,
+                sort=sort,
+                time_filter=time_filter,
+                page_size=page_size,
+                max_results=max_results,
+                after=cursor
+            ):
+                if page.get('error'):
+                    error = page['error']
+                    break
+                total_results += page['total_results']
+                next_cursor = page['after'] if page['has_more'] else None
+                yield ndjson_event('reddit_page', page)
+            succeeded = error is None
+        except Exception:
+            succeeded = False
+            raise
+        finally:
+            report(succeeded)
+
+        yield ndjson_event('summary', {
+            'query': query,
+            'total_results': total_results,
+            'cursor': next_cursor,
+            'error': error
+        })
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # A stream closed before its first page never runs generate's finally
+    response.call_on_close(lambda: report(None))
+    return response
+
 @app.route('/api/stackoverflow/search', methods=['GET'])
 def stackoverflow_search():
     try:
@@ -71,37 +542,47 @@ def stackoverflow_search():
         page = int(request.args.get('page', 1))
         pagesize = int(request.args.get('pagesize', 25))
         tags = request.args.get('tags', '').split(',') if request.args.get('tags') else None
+        fields, summary = requested_projection()
 
         if not query:
             return jsonify({'error': 'Query parameter is required'}), 400
 
-        cache_params = {
-            'platform': 'stackoverflow',
-            'query': query,
-            'sort': sort,
-            'page': page,
-            'pagesize': pagesize,
-            'tags': tags
-        }
+        cache_params = stackoverflow_cache_params(query, sort, page, pagesize, tags, summary)
         
-        cached_results = cache.get_cached_results(**cache_params)
-        if cached_results:
-            return jsonify(cached_results)
-
-        results = stackoverflow_searcher.search(
+        results = cached_search(cache_params, lambda: stackoverflow_searcher.search(
             query=query,
             sort=sort,
             page=page,
             pagesize=pagesize,
-            tags=tags
+            tags=tags,
+            include_answers=not summary
+        ), refresh=stackoverflow_refresher(query, sort, page, pagesize, tags, summary))
+
+        return serialize(project_results(results, fields, summary))
+
+    except Exception as e:
+        return jsonify({'error': f'Stack Overflow API Error: {str(e)}'}), 500
+
+@app.route('/api/stackoverflow/questions/<int:question_id>/answer', methods=['GET'])
+def stackoverflow_answer(question_id):
+    """Top answer for one question, fetched on demand for summary listings and cached"""
+    try:
+        results = cached_search(
+            {'platform': 'stackoverflow_answer', 'question_id': question_id},
+            lambda: guarded_search('stackoverflow', lambda: stackoverflow_searcher.get_answer(question_id))
         )
+        if results.get('error'):
+            return jsonify(results), 502
 
-        cache.cache_results(results, **cache_params)
         return jsonify(results)
 
     except Exception as e:
         return jsonify({'error': f'Stack Overflow API Error: {str(e)}'}), 500
 
+@app.route('/api/stackoverflow/quota', methods=['GET'])
+def stackoverflow_quota():
+    return jsonify(stackexchange_limiter.budget())
+
 @app.route('/api/search', methods=['GET'])
 def combined_search():
     try:
@@ -109,70 +590,778 @@ def combined_search():
         sort = request.args.get('sort', 'relevance')
         time_filter = request.args.get('time', 'month')
         limit = int(request.args.get('limit', 25))
+        fields, summary = requested_projection()
 
         if not query:
             return jsonify({'error': 'Query parameter is required'}), 400
 
-        cache_params = {
-            'platform': 'combined',
+        platform_results = combined_platform_results(query, sort, time_filter, limit, summary)
+
+        combined_results = build_combined_results(
+            query,
+            platform_results['reddit'],
+            platform_results['stackoverflow']
+        )
+        return serialize(project_combined(combined_results, fields, summary))
+
+    except Exception as e:
+        return jsonify({'error': f'Search Error: {str(e)}'}), 500
+
+
+def combined_fetches(query, sort, time_filter, limit, summary=False):
+    """Guarded upstream searches for each platform of a combined search"""
+    return {
+        'reddit': lambda: guarded_search('reddit', lambda: reddit_searcher.search(
+            query=query,
+            sort=sort,
+            time_filter=time_filter,
+            limit=limit
+        )),
+        'stackoverflow': lambda: guarded_search('stackoverflow', lambda: stackoverflow_searcher.search(
+            query=query,
+            sort=sort,
+            page=1,
+            pagesize=limit,
+            include_answers=not summary
+        ))
+    }
+
+
+def combined_platform_results(query, sort, time_filter, limit, summary=False, platforms=PLATFORMS):
+    """Per-platform results of a combined search, fetching only what the cache lacks"""
+    # Assembled from the same per-platform entries the platform endpoints use,
+    # so only a platform missing from the cache goes upstream
+    platform_params = combined_cache_params(query, sort, time_filter, limit, summary)
+    platform_fetches = combined_fetches(query, sort, time_filter, limit, summary)
+    platform_refreshers = combined_refreshers(query, sort, time_filter, limit, summary)
+
+    platform_results = {}
+    calls = {}
+    for platform in platforms:
+        cache_params = platform_params[platform]
+        load = cache_loader(cache_params, platform_fetches[platform])
+        cached_results = lookup_cached(cache_params, load, platform_refreshers[platform])
+        if cached_results:
+            platform_results[platform] = cached_results
+        else:
+            calls[platform] = PlatformCall(platform, search_flight.do, cache.request_key(**cache_params), load)
+
+    for platform, call in calls.items():
+        platform_results[platform] = call.result()
+
+    return platform_results
+
+
+def build_combined_results(query, reddit_results, stackoverflow_results):
+    """Merge per-platform responses into the /api/search shape"""
+    combined_results = {
+        'query': query,
+        'reddit': reddit_results,
+        'stackoverflow': stackoverflow_results,
+        'errors': []
+    }
+
+    if 'error' in reddit_results:
+        combined_results['errors'].append(reddit_results['error'])
+    if 'error' in stackoverflow_results:
+        combined_results['errors'].append(stackoverflow_results['error'])
+
+    # One platform failing still returns the other's results, flagged as partial
+    combined_results['partial'] = bool(combined_results['errors'])
+
+    return combined_results
+
+
+def result_index(query, time_filter, limit, summary, platform_results):
+    """ResultIndex for a combined result set, rebuilt only when the underlying entries change"""
+    items = [
+        {**item, 'source': platform}
+        for platform, results in platform_results.items()
+        for item in results.get('results', [])
+    ]
+    # Entries are replaced by refreshes, so an index is reused only while the
+    # ids and counters it was sorted by are unchanged
+    fingerprint = result_fingerprint(items)
+    key = cache.request_key(
+        platform='results',
+        query=query,
+        time_filter=time_filter,
+        limit=limit,
+        summary=summary,
+        platforms=sorted(platform_results)
+    )
+
+    indexed = result_indexes.get(key)
+    if indexed is None or indexed[0] != fingerprint:
+        indexed = (fingerprint, ResultIndex(items))
+        result_indexes.set(key, indexed)
+    return indexed[1]
+
+
+@app.route('/api/results', methods=['GET'])
+def query_results():
+    """Filtered, sorted page of a combined search, so clients only receive what they display"""
+    query = request.args.get('q', '')
+    time_filter = request.args.get('time', 'month')
+    sort = request.args.get('sort', 'relevance')
+    direction = request.args.get('direction', 'desc')
+    platforms = [p for p in request.args.get('platform', '').split(',') if p] or list(PLATFORMS)
+    tags = [t.strip() for t in request.args.get('tags', '').split(',') if t.strip()] or None
+    fields, summary = requested_projection()
+    try:
+        limit = int(request.args.get('limit', 25))
+        page_size = min(int(request.args.get('page_size', 20)), 100)
+        offset = int(request.args.get('offset', 0))
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+        min_score = request.args.get('min_score', type=float)
+        max_score = request.args.get('max_score', type=float)
+        since = normalize_date(request.args.get('since'))
+        until = normalize_date(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'Invalid numeric, cursor or date parameter'}), 400
+
+    if not query:
+        return jsonify({'error': 'Query parameter is required'}), 400
+    if sort not in SORT_FIELDS or direction not in DIRECTIONS:
+        return jsonify({'error': f'sort must be one of {", ".join(SORT_FIELDS)} and direction asc or desc'}), 400
+    if any(platform not in PLATFORMS for platform in platforms):
+        return jsonify({'error': f'platform must be among {", ".join(PLATFORMS)}'}), 400
+    if page_size < 1 or offset < 0 or (cursor is not None and cursor < 0):
+        return jsonify({'error': 'page_size must be positive and offset/cursor non-negative'}), 400
+
+    try:
+        # Upstream results are always fetched in relevance order; sort applies locally
+        platform_results = combined_platform_results(
+            query, 'relevance', time_filter, limit, summary, platforms=platforms
+        )
+        index = result_index(query, time_filter, limit, summary, platform_results)
+        page = index.query(
+            tags=tags,
+            min_score=min_score,
+            max_score=max_score,
+            since=since,
+            until=until,
+            sort=sort,
+            direction=direction,
+            offset=offset,
+            limit=page_size,
+            cursor=cursor
+        )
+
+        errors = [results['error'] for results in platform_results.values() if results.get('error')]
+        return serialize({
             'query': query,
             'sort': sort,
-            'time_filter': time_filter,
-            'limit': limit
-        }
-        
-        cached_results = cache.get_cached_results(**cache_params)
+            'direction': direction,
+            'total': page['total'],
+            'offset': offset if cursor is None else None,
+            'page_size': page_size,
+            'next_cursor': str(page['next_cursor']) if page['next_cursor'] is not None else None,
+            'results': project_results({'results': page['results']}, fields, summary)['results'],
+            'errors': errors,
+            'partial': bool(errors)
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'Search Error: {str(e)}'}), 500
+
+
+def parse_batch_spec(spec):
+    """(search parameters, error) for one query of a batch request"""
+    if not isinstance(spec, dict) or not spec.get('q'):
+        return None, 'q is required'
+
+    platforms = spec.get('platforms') or list(PLATFORMS)
+    if not isinstance(platforms, list) or any(platform not in PLATFORMS for platform in platforms):
+        return None, f'platforms must be among {", ".join(PLATFORMS)}'
+
+    try:
+        limit = int(spec.get('limit', 25))
+    except (TypeError, ValueError):
+        return None, 'limit must be an integer'
+
+    return {
+        'query': spec['q'],
+        'sort': spec.get('sort', 'relevance'),
+        'time_filter': spec.get('time', 'month'),
+        'limit': limit,
+        'platforms': platforms
+    }, None
+
+
+def batch_fetch(platform, fetch):
+    """Run one upstream batch fetch inside the platform's concurrency and rate limits"""
+    with batch_platform_slots[platform]:
+        if platform == 'reddit' and not reddit_batch_limiter.acquire():
+            return {'error': 'Reddit batch rate limit reached', 'rate_limited': True, 'results': []}
+        return fetch()
+
+
+@app.route('/api/search/batch', methods=['POST'])
+def batch_search():
+    """Combined search for many queries: cache hits in one bulk read, misses fanned out under limits"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Request body must be a JSON object with a queries list'}), 400
+    specs = payload.get('queries')
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': 'queries must be a non-empty list'}), 400
+    if len(specs) > BATCH_MAX_QUERIES:
+        return jsonify({'error': f'At most {BATCH_MAX_QUERIES} queries per batch'}), 400
+    stream = bool(payload.get('stream')) or request.args.get('stream') == 'true'
+
+    parsed = [parse_batch_spec(spec) for spec in specs]
+    lookups = [
+        (index, platform, combined_cache_params(
+            params['query'], params['sort'], params['time_filter'], params['limit']
+        )[platform])
+        for index, (params, _) in enumerate(parsed) if params
+        for platform in params['platforms']
+    ]
+    with metrics.stage('cache_lookup', 'batch'):
+        cached_entries = cache.get_cached_entries([cache_params for _, _, cache_params in lookups])
+
+    started = time.monotonic()
+    platform_results = [{} for _ in specs]
+    cached_platforms = [[] for _ in specs]
+    waiting = [{} for _ in specs]
+    # Identical searches within the batch share one upstream fetch
+    pending = {}
+    for (index, platform, cache_params), (cached_results, is_stale) in zip(lookups, cached_entries):
+        record_cache_lookup(cache_params, cached_results, is_stale)
+        params = parsed[index][0]
+        search_args = (params['query'], params['sort'], params['time_filter'], params['limit'])
+        fetch = combined_fetches(*search_args)[platform]
+        load = cache_loader(cache_params, lambda platform=platform, fetch=fetch: batch_fetch(platform, fetch))
+
         if cached_results:
-            return jsonify(cached_results)
+            if is_stale:
+                schedule_stale_refresh(cache_params, load, combined_refreshers(*search_args)[platform])
+            platform_results[index][platform] = cached_results
+            cached_platforms[index].append(platform)
+            continue
+
+        key = cache.request_key(**cache_params)
+        if key not in pending:
+            pending[key] = submit_in_context(batch_executor, search_flight.do, key, load)
+        waiting[index][platform] = pending[key]
 
-        def reddit_search_task():
+    def batch_entry(index):
+        params, error = parsed[index]
+        if error:
+            return {'index': index, 'error': error}
+
+        for platform, future in waiting[index].items():
+            remaining = BATCH_DEADLINE_SECONDS - (time.monotonic() - started)
             try:
-                return reddit_searcher.search(
-                    query=query,
-                    sort=sort,
-                    time_filter=time_filter,
-                    limit=limit
-                )
+                platform_results[index][platform] = future.result(timeout=max(0, remaining))
+            except FutureTimeoutError:
+                # Left running so its result is cached for the next request
+                platform_results[index][platform] = platform_timed_out(platform)
             except Exception as e:
-                return {'error': f'Reddit API Error: {str(e)}', 'results': []}
+                platform_results[index][platform] = {
+                    'error': f'{platform_labels[platform]} API Error: {str(e)}',
+                    'results': []
+                }
+
+        errors = [results['error'] for results in platform_results[index].values() if results.get('error')]
+        return {
+            'index': index,
+            'query': params['query'],
+            **platform_results[index],
+            'errors': errors,
+            'partial': bool(errors),
+            'cached': cached_platforms[index]
+        }
+
+    summary = {
+        'queries': len(specs),
+        'cache_hits': sum(len(platforms) for platforms in cached_platforms),
+        'upstream_fetches': len(pending)
+    }
+
+    if not stream:
+        return jsonify({**summary, 'results': [batch_entry(index) for index in range(len(specs))]})
+
+    def generate():
+        # Queries are emitted as soon as all of their platforms have resolved
+        unresolved = {index: set(futures.values()) for index, futures in enumerate(waiting) if futures}
+        for index in range(len(specs)):
+            if index not in unresolved:
+                yield ndjson_event('result', batch_entry(index))
+
+        indices_by_future = {}
+        for index, futures in unresolved.items():
+            for future in futures:
+                indices_by_future.setdefault(future, []).append(index)
+
+        remaining = BATCH_DEADLINE_SECONDS - (time.monotonic() - started)
+        try:
+            for future in as_completed(indices_by_future, timeout=max(0, remaining)):
+                for index in indices_by_future[future]:
+                    unresolved[index].discard(future)
+                    if not unresolved[index]:
+                        del unresolved[index]
+                        yield ndjson_event('result', batch_entry(index))
+        except FutureTimeoutError:
+            pass
+
+        for index in list(unresolved):
+            yield ndjson_event('result', batch_entry(index))
+        yield ndjson_event('summary', summary)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def ndjson_event(event, data):
+    return json.dumps({'event': event, 'data': data}, default=str) + '\n'
+
+
+def stackoverflow_events(stackoverflow_results):
+    """Split a Stack Overflow response into per-question events plus a trailing summary"""
+    for question in stackoverflow_results.get('results', []):
+        yield ndjson_event('stackoverflow_question', question)
+    yield ndjson_event('stackoverflow', {k: v for k, v in stackoverflow_results.items() if k != 'results'})
+
+
+@app.route('/api/search/stream', methods=['GET'])
+def combined_search_stream():
+    """NDJSON variant of /api/search that emits each platform's results as they arrive"""
+    query = request.args.get('q', '')
+    sort = request.args.get('sort', 'relevance')
+    time_filter = request.args.get('time', 'month')
+    try:
+        limit = int(request.args.get('limit', 25))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    if not query:
+        return jsonify({'error': 'Query parameter is required'}), 400
+
+    platform_params = combined_cache_params(query, sort, time_filter, limit)
+
+    def generate():
+        events = queue.Queue()
+        platform_results = {}
+
+        reddit_load = cache_loader(platform_params['reddit'], lambda: guarded_search('reddit', lambda: reddit_searcher.search(
+            query=query,
+            sort=sort,
+            time_filter=time_filter,
+            limit=limit
+        )))
+        stackoverflow_load = cache_loader(platform_params['stackoverflow'], lambda: guarded_search(
+            'stackoverflow',
+            lambda: stackoverflow_searcher.search(query=query, sort=sort, page=1, pagesize=limit)
+        ))
+
+        def reddit_stream_task():
+            events.put(('reddit', search_flight.do(cache.request_key(**platform_params['reddit']), reddit_load)))
 
-        def stackoverflow_search_task():
+        led = threading.Event()
+
+        def stackoverflow_stream_load():
+            # Run by the single-flight leader only; its questions are streamed as they arrive
+            breaker = circuit_breakers['stackoverflow']
+            if not breaker.allow_request():
+                return platform_unavailable('stackoverflow')
+            succeeded = None
+            results = None
+            started = time.monotonic()
             try:
-                return stackoverflow_searcher.search(
+                for kind, payload in stackoverflow_searcher.iter_search(
                     query=query,
                     sort=sort,
                     page=1,
                     pagesize=limit
-                )
+                ):
+                    if kind == 'question':
+                        events.put(('stackoverflow_question', payload))
+                        continue
+                    if not payload.get('error'):
+                        cache.cache_results(payload, **platform_params['stackoverflow'])
+                    succeeded = not payload.get('error') and met_deadline('stackoverflow', started)
+                    results = payload
             except Exception as e:
-                return {'error': f'Stack Overflow API Error: {str(e)}', 'results': []}
+                succeeded = False
+                results = {'error': f'Stack Overflow API Error: {str(e)}', 'results': []}
+            finally:
+                breaker.record_outcome(succeeded)
+            led.set()
+            return results
+
+        def stackoverflow_stream_task():
+            results = search_flight.do(cache.request_key(**platform_params['stackoverflow']), stackoverflow_stream_load)
+            # Streams that joined another request's fetch have seen none of its questions yet
+            events.put(('stackoverflow' if led.is_set() else 'stackoverflow_shared', results))
+
+        started = time.monotonic()
+        cached_platforms = []
+        platform_refreshers = combined_refreshers(query, sort, time_filter, limit)
+
+        reddit_cached = lookup_cached(platform_params['reddit'], reddit_load, platform_refreshers['reddit'])
+        if reddit_cached:
+            platform_results['reddit'] = reddit_cached
+            cached_platforms.append('reddit')
+            yield ndjson_event('reddit', reddit_cached)
+        else:
+            submit_in_context(platform_executors['reddit'], reddit_stream_task)
+
+        stackoverflow_cached = lookup_cached(
+            platform_params['stackoverflow'],
+            stackoverflow_load,
+            platform_refreshers['stackoverflow']
+        )
+        if stackoverflow_cached:
+            platform_results['stackoverflow'] = stackoverflow_cached
+            cached_platforms.append('stackoverflow')
+            yield from stackoverflow_events(stackoverflow_cached)
+        else:
+            submit_in_context(platform_executors['stackoverflow'], stackoverflow_stream_task)
 
-        reddit_future = executor.submit(reddit_search_task)
-        stackoverflow_future = executor.submit(stackoverflow_search_task)
+        while len(platform_results) < 2:
+            pending = [p for p in platform_deadlines if p not in platform_results]
+            # Wake for the nearest deadline so a fast platform's timeout is reported on time
+            remaining = min(platform_deadlines[p] for p in pending) - (time.monotonic() - started)
+            try:
+                event, payload = events.get(timeout=max(0, remaining))
+            except queue.Empty:
+                for platform in pending:
+                    if platform_deadlines[platform] - (time.monotonic() - started) <= 0:
+                        platform_results[platform] = platform_timed_out(platform)
+                        yield ndjson_event(platform, platform_results[platform])
+                continue
 
-        reddit_results = reddit_future.result()
-        stackoverflow_results = stackoverflow_future.result()
+            if event == 'stackoverflow_shared':
+                event = 'stackoverflow'
+                if event not in platform_results:
+                    platform_results[event] = payload
+                    yield from stackoverflow_events(payload)
+                continue
+            if event in platform_results:
+                # Arrived after its deadline was already reported
+                continue
+            if event == 'stackoverflow_question':
+                yield ndjson_event(event, payload)
+            elif event == 'stackoverflow':
+                platform_results[event] = payload
+                yield ndjson_event(event, {k: v for k, v in payload.items() if k != 'results'})
+            else:
+                platform_results[event] = payload
+                yield ndjson_event(event, payload)
 
-        combined_results = {
+        combined_results = build_combined_results(
+            query,
+            platform_results['reddit'],
+            platform_results['stackoverflow']
+        )
+        yield ndjson_event('summary', {
             'query': query,
-            'reddit': reddit_results,
-            'stackoverflow': stackoverflow_results,
-            'errors': []
+            'errors': combined_results['errors'],
+            'partial': combined_results['partial'],
+            'cached': cached_platforms
+        })
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def request_deadline():
+    """Per-request upstream deadline in seconds, from ?deadline= or the engine default"""
+    deadline = request.args.get('deadline', type=float)
+    if deadline is None or deadline <= 0:
+        return search_engine.default_deadline
+    return min(deadline, search_engine.default_deadline)
+
+
+async def guarded_search_async(platform, coro):
+    """Run one platform's search coroutine behind its circuit breaker and deadline"""
+    breaker = circuit_breakers[platform]
+    if not breaker.allow_request():
+        coro.close()
+        return platform_unavailable(platform)
+
+    # Cancellation by an outer deadline leaves succeeded as None, which frees a
+    # half-open probe slot instead of holding the breaker half-open
+    succeeded = None
+    try:
+        results = await asyncio.wait_for(coro, platform_deadlines[platform])
+        succeeded = not results.get('error')
+        return results
+    except asyncio.TimeoutError:
+        succeeded = False
+        return platform_timed_out(platform)
+    except Exception as e:
+        succeeded = False
+        return {'error': f'{platform_labels[platform]} API Error: {str(e)}', 'results': []}
+    finally:
+        breaker.record_outcome(succeeded)
+
+
+def async_cache_loader(cache_params, make_coro):
+    """Coroutine factory, awaited on the engine loop, that fetches once per cache key and caches a success"""
+    async def load():
+        results = await make_coro()
+        if not results.get('error') and not results.get('errors'):
+            # Cache writes can block on Mongo, so they stay off the engine loop
+            await asyncio.to_thread(cache.cache_results, results, **cache_params)
+        return results
+
+    key = cache.request_key(**cache_params)
+    return lambda: async_search_flight.do(key, load)
+
+
+def timed_out_after(deadline, query=None):
+    return {'error': f'Search timed out after {deadline}s', 'timed_out': True, 'query': query, 'results': []}
+
+
+async def cached_search_async(cache_params, make_coro, deadline, refresh=None):
+    """cached_search whose upstream fetch is awaited on the async engine under a deadline"""
+    shared_load = async_cache_loader(cache_params, make_coro)
+
+    # Stale entries are replaced on the refresh threads, joining any fetch already in flight
+    cached_results = lookup_cached(cache_params, lambda: search_engine.run(shared_load()), refresh)
+    if cached_results:
+        return cached_results
+
+    try:
+        return await search_engine.submit(shared_load(), timeout=deadline)
+    except asyncio.TimeoutError:
+        return timed_out_after(deadline, cache_params['query'])
+
+
+@app.route('/api/async/reddit/search', methods=['GET'])
+async def async_reddit_search():
+    try:
+        query = request.args.get('q', '')
+        sort = request.args.get('sort', 'relevance')
+        time_filter = request.args.get('time', 'month')
+        limit = int(request.args.get('limit', 25))
+        fields, summary = requested_projection()
+
+        if not query:
+            return jsonify({'error': 'Query parameter is required'}), 400
+
+        cache_params = reddit_cache_params(query, sort, time_filter, limit)
+
+        results = await cached_search_async(cache_params, lambda: reddit_searcher.search_async(
+            query=query,
+            sort=sort,
+            time_filter=time_filter,
+            limit=limit
+        ), request_deadline(), refresh=reddit_refresher(query, sort, time_filter, limit))
+
+        return serialize(project_results(results, fields, summary))
+
+    except Exception as e:
+        return jsonify({'error': f'Reddit API Error: {str(e)}'}), 500
+
+
+@app.route('/api/async/stackoverflow/search', methods=['GET'])
+async def async_stackoverflow_search():
+    try:
+        query = request.args.get('q', '')
+        sort = request.args.get('sort', 'relevance')
+        page = int(request.args.get('page', 1))
+        pagesize = int(request.args.get('pagesize', 25))
+        tags = request.args.get('tags', '').split(',') if request.args.get('tags') else None
+        fields, summary = requested_projection()
+
+        if not query:
+            return jsonify({'error': 'Query parameter is required'}), 400
+
+        cache_params = stackoverflow_cache_params(query, sort, page, pagesize, tags, summary)
+
+        results = await cached_search_async(cache_params, lambda: stackoverflow_searcher.search_async(
+            query=query,
+            sort=sort,
+            page=page,
+            pagesize=pagesize,
+            tags=tags,
+            include_answers=not summary
+        ), request_deadline(), refresh=stackoverflow_refresher(query, sort, page, pagesize, tags, summary))
+
+        return serialize(project_results(results, fields, summary))
+
+    except Exception as e:
+        return jsonify({'error': f'Stack Overflow API Error: {str(e)}'}), 500
+
+
+@app.route('/api/async/search', methods=['GET'])
+async def async_combined_search():
+    try:
+        query = request.args.get('q', '')
+        sort = request.args.get('sort', 'relevance')
+        time_filter = request.args.get('time', 'month')
+        limit = int(request.args.get('limit', 25))
+        fields, summary = requested_projection()
+
+        if not query:
+            return jsonify({'error': 'Query parameter is required'}), 400
+
+        platform_params = combined_cache_params(query, sort, time_filter, limit, summary)
+        platform_coros = {
+            'reddit': lambda: reddit_searcher.search_async(
+                query=query,
+                sort=sort,
+                time_filter=time_filter,
+                limit=limit
+            ),
+            'stackoverflow': lambda: stackoverflow_searcher.search_async(
+                query=query,
+                sort=sort,
+                page=1,
+                pagesize=limit,
+                include_answers=not summary
+            )
         }
 
-        if 'error' in reddit_results:
-            combined_results['errors'].append(reddit_results['error'])
-        if 'error' in stackoverflow_results:
-            combined_results['errors'].append(stackoverflow_results['error'])
+        platform_refreshers = combined_refreshers(query, sort, time_filter, limit, summary)
+        shared_loads = {
+            platform: async_cache_loader(
+                cache_params,
+                lambda platform=platform: guarded_search_async(platform, platform_coros[platform]())
+            )
+            for platform, cache_params in platform_params.items()
+        }
+
+        platform_results = {}
+        missing = []
+        for platform, cache_params in platform_params.items():
+            cached_results = lookup_cached(
+                cache_params,
+                lambda platform=platform: search_engine.run(shared_loads[platform]()),
+                platform_refreshers[platform]
+            )
+            if cached_results:
+                platform_results[platform] = cached_results
+            else:
+                missing.append(platform)
+
+        if missing:
+            deadline = request_deadline()
 
+            async def fetch_missing():
+                tasks = [asyncio.ensure_future(shared_loads[platform]()) for platform in missing]
+                _, running = await asyncio.wait(tasks, timeout=deadline)
+                # Only this request stops waiting; shared fetches carry on and still fill the cache
+                for task in running:
+                    task.cancel()
+                return [timed_out_after(deadline) if task in running else task.result() for task in tasks]
+
+            try:
+                fetched = await search_engine.submit(fetch_missing())
+            except asyncio.TimeoutError:
+                fetched = [timed_out_after(deadline) for _ in missing]
+            platform_results.update(zip(missing, fetched))
 
-        cache.cache_results(combined_results, **cache_params)
-        return jsonify(combined_results)
+        combined_results = build_combined_results(
+            query,
+            platform_results['reddit'],
+            platform_results['stackoverflow']
+        )
+        return serialize(project_combined(combined_results, fields, summary))
 
     except Exception as e:
         return jsonify({'error': f'Search Error: {str(e)}'}), 500
 
 
+@app.route('/api/circuit-breakers', methods=['GET'])
+def circuit_breaker_stats():
+    return jsonify({platform: breaker.stats() for platform, breaker in circuit_breakers.items()})
+
+
+def executor_queue_depth():
+    # ThreadPoolExecutor has no public queue size; _work_queue is a plain queue.Queue
+    return [
+        *(({'pool': platform}, pool._work_queue.qsize()) for platform, pool in platform_executors.items()),
+        ({'pool': 'batch'}, batch_executor._work_queue.qsize())
+    ]
+
+
+def memory_cache_samples(field):
+    return [
+        ({'cache': 'search'}, cache.memory.stats()[field]),
+        ({'cache': 'result_index'}, result_indexes.stats()[field]),
+        ({'cache': 'email_fragment'}, email_renderer.stats()[field])
+    ]
+
+
+metrics.register_callback(
+    'executor_queue_depth', 'gauge', 'Searches waiting for a worker thread', executor_queue_depth
+)
+metrics.register_callback(
+    'single_flight_in_flight', 'gauge', 'Upstream fetches currently shared by concurrent requests',
+    lambda: [({}, search_flight.in_flight() + async_search_flight.in_flight())]
+)
+metrics.register_callback(
+    'stackexchange_quota_remaining', 'gauge', 'Daily StackExchange quota left as last reported by the API',
+    lambda: [({}, stackexchange_limiter.quota_remaining)]
+)
+metrics.register_callback(
+    'circuit_breaker_open', 'gauge', '1 while a platform breaker is rejecting calls',
+    lambda: [({'platform': p}, int(b.state == CircuitBreaker.OPEN)) for p, b in circuit_breakers.items()]
+)
+metrics.register_callback(
+    'email_queue_depth', 'gauge', 'Emails waiting for the delivery worker',
+    lambda: [({}, email_queue.stats()['queued'])]
+)
+metrics.register_callback(
+    'memory_cache_hits_total', 'counter', 'In-process cache hits', lambda: memory_cache_samples('hits')
+)
+metrics.register_callback(
+    'memory_cache_misses_total', 'counter', 'In-process cache misses', lambda: memory_cache_samples('misses')
+)
+metrics.register_callback(
+    'memory_cache_entries', 'gauge', 'Entries held in the in-process caches', lambda: memory_cache_samples('entries')
+)
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def profile_access_error():
+    if not profiler.enabled:
+        return jsonify({'error': 'Profiling is not enabled'}), 404
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return jsonify({'error': f'A valid {PROFILE_HEADER} header is required'}), 403
+    return None
+
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    error = profile_access_error()
+    if error:
+        return error
+    return jsonify({'sample_rate': profiler.sample_rate, 'profiles': profiler.summaries()})
+
+
+@app.route('/api/profiles/<int:profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    error = profile_access_error()
+    if error:
+        return error
+
+    fmt = request.args.get('format', 'pstats')
+    if fmt not in ('pstats', 'collapsed', 'text'):
+        return jsonify({'error': 'format must be pstats, collapsed or text'}), 400
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found or already evicted'}), 404
+
+    extension, mimetype = {
+        'pstats': ('prof', 'application/octet-stream'),
+        'collapsed': ('folded', 'text/plain'),
+        'text': ('txt', 'text/plain')
+    }[fmt]
+    return Response(
+        profiler.export(profile, fmt),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.{extension}'}
+    )
+
+
 @app.route('/api/cache/clear', methods=['POST'])
 def clear_cache():
     try:
@@ -182,77 +1371,13 @@ def clear_cache():
         return jsonify({'error': f'Cache clear error: {str(e)}'}), 500
 
 
-def create_email_html(results):
-    """Create HTML email content from search results"""
-    html = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }
-            .container { max-width: 800px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 10px; }
-            .header { text-align: center; margin-bottom: 30px; }
-            .header h1 { color: #2563eb; margin-bottom: 10px; }
-            .result-card { border: 1px solid #e5e7eb; padding: 15px; margin-bottom: 15px; border-radius: 8px; }
-            .source-badge { display: inline-block; padding: 3px 8px; border-radius: 12px; font-size: 12px; margin-bottom: 8px; }
-            .reddit { background-color: #ff4500; color: white; }
-            .stackoverflow { background-color: #0077cc; color: white; }
-            .title { font-size: 18px; color: #1f2937; margin-bottom: 8px; }
-            .metadata { font-size: 12px; color: #6b7280; margin-bottom: 8px; }
-            .stats { font-size: 12px; color: #374151; }
-            .tags { margin-top: 8px; }
-            .tag { background-color: #dbeafe; color: #1e40af; padding: 2px 8px; border-radius: 12px; font-size: 12px; margin-right: 4px; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>Tech Search Results</h1>
-                <p>Here are your requested search results from Tech Search Hub</p>
-            </div>
-    """
-    
-    for result in results:
-        html += f"""
-            <div class="result-card">
-                <span class="source-badge {'reddit' if result['source'] == 'reddit' else 'stackoverflow'}">
-                    {result['source'].title()}
-                </span>
-                <div class="title">{result['title']}</div>
-                <div class="metadata">
-                    {'Posted by ' + result['author'] if 'author' in result else 'Asked by ' + result['owner']['name']} • 
-                    {result['created_at']}
-                </div>
-        """
-        
-        if result['source'] == 'reddit':
-            html += f"""
-                <div class="stats">
-                    🔼 {result['score']} • 
-                    💬 {result['num_comments']} comments • 
-                    {round(result['upvote_ratio'] * 100)}% upvoted
-                </div>
-            """
-        else:
-            html += f"""
-                <div class="stats">
-                    🔼 {result['score']} • 
-                    💬 {result['answer_count']} answers • 
-                    👁️ {result['view_count']} views
-                </div>
-                <div class="tags">
-                    {''.join([f'<span class="tag">{tag}</span>' for tag in result['tags']])}
-                </div>
-            """
-        
-        html += "</div>"
-    
-    html += """
-        </div>
-    </body>
-    </html>
-    """
-    return html
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    try:
+        return jsonify(cache.stats())
+    except Exception as e:
+        return jsonify({'error': f'Cache stats error: {str(e)}'}), 500
+
 
 @app.route('/api/email-results', methods=['POST'])
 def email_results():
@@ -271,19 +1396,39 @@ def email_results():
         msg['To'] = recipient_email
         
 
-        html_content = create_email_html(results)
+        html_content, text_content = email_renderer.render(results, query)
+        # Clients show the last alternative they support, so HTML goes last
+        msg.attach(MIMEText(text_content, 'plain'))
         msg.attach(MIMEText(html_content, 'html'))
         
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(os.getenv('MAIL_USERNAME'), os.getenv('MAIL_PASSWORD'))
-            smtp.send_message(msg)
+        # Delivered by the queue's worker over its pooled SMTP connection
+        job_id = email_queue.submit(msg)
             
-        return jsonify({'message': 'Email sent successfully'})
+        return jsonify({
+            'message': 'Email queued for delivery',
+            'job_id': job_id,
+            'status_url': f'/api/email-results/{job_id}'
+        }), 202
         
+    except EmailQueueFullError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': f'Failed to send email: {str(e)}'}), 500
 
 
+@app.route('/api/email-results/<job_id>', methods=['GET'])
+def email_status(job_id):
+    job = email_queue.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired email job'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/email-results/stats', methods=['GET'])
+def email_stats():
+    return jsonify(email_queue.stats())
+
+
 if __name__ == '__main__':
     os.makedirs('templates', exist_ok=True)
     app.run(debug=True, host="0.0.0.0")
\ No newline at end of file
@@ -0,0 +1,160 @@
+import aiohttp
+import asyncio
+import contextvars
+from concurrent.futures import Future
+from typing import Any, Awaitable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import random
+import threading
+import time
+import os
+import dotenv
+dotenv.load_dotenv()
+
+from metrics import Metrics, get_default_metrics
+
+# Transient upstream failures worth another try; 429 is left to the callers
+# since the StackExchange quota is not something a quick retry can fix
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class AsyncSearchEngine:
+    """Runs search coroutines on one background event loop with non-blocking HTTP
+
+    This is the only upstream HTTP path: the searchers' blocking methods run
+    their coroutines here through run(), in the caller's context so stage
+    timings still reach its Server-Timing header and profile. Under a WSGI
+    server each request still holds a thread while it waits, so the async
+    routes only gain real concurrency when served by an ASGI server (e.g.
+    uvicorn with asgiref's WsgiToAsgi); on WSGI they perform like the sync ones.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = int(os.getenv('ASYNC_MAX_CONCURRENCY', 200)),
+                 pool_size: int = int(os.getenv('ASYNC_POOL_SIZE', 100)),
+                 connect_timeout: float = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05)),
+                 read_timeout: float = float(os.getenv('HTTP_READ_TIMEOUT', 10)),
+                 max_retries: int = int(os.getenv('HTTP_MAX_RETRIES', 2)),
+                 backoff_factor: float = 0.3,
+                 backoff_jitter: float = 0.3,
+                 default_deadline: float = float(os.getenv('SEARCH_DEADLINE_SECONDS', 15)),
+                 metrics: Optional[Metrics] = None):
+
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.default_deadline = default_deadline
+        self.metrics = metrics or get_default_metrics()
+
+        self._session = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+        self.loop = None
+        self._thread = None
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self.loop is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self.loop.run_forever, name='async-search-engine', daemon=True)
+            self._thread.start()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Created on the engine loop so every request shares its connector
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={'Accept-Encoding': 'gzip, deflate'}
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def get_json(self, url: str, headers: Optional[Dict] = None, params: Optional[Dict] = None) -> Tuple[int, Any]:
+        """GET a URL and return (status, decoded JSON body or None)"""
+        status, data, _ = await self.fetch_json(url, headers=headers, params=params)
+        return status, data if status < 400 else None
+
+    async def fetch_json(self,
+                         url: str,
+                         headers: Optional[Dict] = None,
+                         params: Optional[Dict] = None) -> Tuple[int, Any, Dict]:
+        """GET a URL and return (status, decoded JSON body or None, response headers); error bodies are decoded too"""
+        session = await self._get_session()
+        query = {k: str(v) for k, v in (params or {}).items() if v is not None}
+
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1) + random.uniform(0, self.backoff_jitter))
+                status = 'error'
+                try:
+                    status, data, response_headers = await self._get(session, url, headers, query)
+                except aiohttp.ClientConnectionError:
+                    if attempt == self.max_retries:
+                        raise
+                    continue
+                if status not in RETRY_STATUSES or attempt == self.max_retries:
+                    return status, data, response_headers
+        finally:
+            # Retries happen in here, so this is the caller-visible latency
+            self.metrics.record_upstream(urlsplit(url).netloc, status, time.perf_counter() - started)
+
+    async def _get(self, session: aiohttp.ClientSession, url: str, headers: Optional[Dict], query: Dict) -> Tuple[int, Any, Dict]:
+        # Global cap on upstream calls in flight across all searches; a
+        # retry backs off without holding a slot
+        async with self._semaphore:
+            async with session.get(url, headers=headers, params=query) as response:
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    if response.status < 400:
+                        raise
+                    data = None
+                return response.status, data, response.headers
+
+    def start(self, coro: Awaitable, timeout: Optional[float] = None) -> Future:
+        """Schedule a coroutine on the engine loop under a deadline, in a copy of the caller's context"""
+        self._ensure_started()
+        deadline = self.default_deadline if timeout is None else timeout
+        # The loop runs a callback, and the task it creates, in the context
+        # current when the callback was scheduled; copying it here on the
+        # calling thread carries the request's stage timings and profile along
+        context = contextvars.copy_context()
+        return context.run(asyncio.run_coroutine_threadsafe, asyncio.wait_for(coro, deadline), self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the engine loop from synchronous code, enforcing a deadline"""
+        return self.start(coro, timeout).result()
+
+    async def submit(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Await a coroutine on the engine loop from another event loop, enforcing a deadline"""
+        return await asyncio.wrap_future(self.start(coro, timeout))
+
+    def close(self):
+        """Close the shared session and stop the loop"""
+        if self.loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+
+def get_default_engine() -> AsyncSearchEngine:
+    """Return the process-wide AsyncSearchEngine, creating it on first use"""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = AsyncSearchEngine()
+        return _default_engine
@@ -0,0 +1,91 @@
+"""Compare BeautifulSoup answer cleaning with the streaming extractor, cold and memoized.
+
+Runs offline on synthetic answer bodies. The BeautifulSoup version is the
+implementation StackOverflowSearcher._clean_html used before answer_text.
+
+    python benchmarks/answer_text_benchmark.py [--answers 100] [--paragraphs 40] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_text import AnswerTextExtractor, extract_answer_text
+from benchmarks.fixtures import answer_body
+
+
+def soup_clean_html(html_content):
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    code_blocks = []
+    for code in soup.find_all('code'):
+        code_blocks.append(f"Code: {code.get_text()}")
+        code.decompose()
+
+    text = soup.get_text(separator=' ').strip()
+    text = ' '.join(text.split())
+
+    if code_blocks:
+        text += '\n\nCode Examples:\n' + '\n'.join(code_blocks[:2])
+    return text
+
+
+def streaming_clean_html(html_content, extract=extract_answer_text):
+    extracted = extract(html_content)
+    text = extracted['text']
+    code_blocks = [f"Code: {code}" for code in extracted['code_blocks']]
+    if code_blocks:
+        text += '\n\nCode Examples:\n' + '\n'.join(code_blocks[:2])
+    return text
+
+
+def timed(fn, bodies, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for answer_id, body in bodies:
+            fn(answer_id, body)
+    elapsed = time.perf_counter() - started
+    return round(elapsed / (repeat * len(bodies)) * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--answers', type=int, default=100)
+    parser.add_argument('--paragraphs', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    bodies = [
+        (10000 + i, answer_body(rng, paragraphs=args.paragraphs, code_blocks=args.paragraphs // 4))
+        for i in range(args.answers)
+    ]
+
+    mismatches = sum(1 for _, body in bodies if soup_clean_html(body) != streaming_clean_html(body))
+
+    extractor = AnswerTextExtractor(max_entries=args.answers * 2)
+    soup_us = timed(lambda _, body: soup_clean_html(body), bodies, args.repeat)
+    streaming_us = timed(lambda _, body: streaming_clean_html(body), bodies, args.repeat)
+    # Warm the memo so this measures repeat displays of already ingested answers
+    timed(lambda answer_id, body: extractor.summarize(body, answer_id), bodies, 1)
+    memoized_us = timed(lambda answer_id, body: extractor.summarize(body, answer_id), bodies, args.repeat)
+
+    print(json.dumps({
+        'answers': args.answers,
+        'avg_body_bytes': round(sum(len(body) for _, body in bodies) / len(bodies)),
+        'output_mismatches': mismatches,
+        'beautifulsoup_us_per_answer': soup_us,
+        'streaming_us_per_answer': streaming_us,
+        'memoized_us_per_answer': memoized_us,
+        'streaming_speedup': round(soup_us / streaming_us, 2)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
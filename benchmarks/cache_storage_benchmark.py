@@ -0,0 +1,79 @@
+"""Compare stored size and read latency of plain vs zlib-compressed cache documents.
+
+Runs offline: documents are encoded to BSON exactly as MongoCache would write
+them and decoded back the way get_cached_results reads them.
+
+    python benchmarks/cache_storage_benchmark.py [--results 25] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import bson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongo_cache import MongoCache
+from benchmarks.fixtures import reddit_results, stackoverflow_results
+
+
+def encode_document(cache, results):
+    return bson.encode({
+        'query_hash': 'x' * 32,
+        **cache._encode_results(results),
+        'timestamp': datetime.utcnow(),
+        'parameters': {'platform': 'bench', 'query': 'python flask'}
+    })
+
+
+def measure(cache, results, repeat):
+    encoded = encode_document(cache, results)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode_document(cache, results)
+    write_us = (time.perf_counter() - started) / repeat * 1e6
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        cache._decode_results(bson.decode(encoded))
+    read_us = (time.perf_counter() - started) / repeat * 1e6
+
+    return {'bson_bytes': len(encoded), 'encode_us': round(write_us, 1), 'read_us': round(read_us, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results', type=int, default=25)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    payloads = {
+        'stackoverflow': stackoverflow_results(args.results),
+        'reddit': reddit_results(args.results)
+    }
+
+    report = {}
+    for name, results in payloads.items():
+        plain = MongoCache()
+        plain.compression = 'none'
+        compressed = MongoCache()
+        compressed.compression = 'zlib'
+
+        before = measure(plain, results, args.repeat)
+        after = measure(compressed, results, args.repeat)
+        report[name] = {
+            'results': args.results,
+            'plain': before,
+            'zlib': after,
+            'size_ratio': round(after['bson_bytes'] / before['bson_bytes'], 3)
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
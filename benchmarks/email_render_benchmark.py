@@ -0,0 +1,171 @@
+"""Compare string-concatenated result emails with the compiled, fragment-cached renderer.
+
+Runs offline on synthetic results. concat_email_html is the implementation
+app.create_email_html used before email_renderer.
+
+    python benchmarks/email_render_benchmark.py [--results 500] [--repeat 5] [--changed 0.1]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_renderer import EmailRenderer
+from benchmarks.fixtures import reddit_results, stackoverflow_results
+
+STYLE = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }
+            .container { max-width: 800px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 10px; }
+            .header { text-align: center; margin-bottom: 30px; }
+            .header h1 { color: #2563eb; margin-bottom: 10px; }
+            .result-card { border: 1px solid #e5e7eb; padding: 15px; margin-bottom: 15px; border-radius: 8px; }
+            .source-badge { display: inline-block; padding: 3px 8px; border-radius: 12px; font-size: 12px; margin-bottom: 8px; }
+            .reddit { background-color: #ff4500; color: white; }
+            .stackoverflow { background-color: #0077cc; color: white; }
+            .title { font-size: 18px; color: #1f2937; margin-bottom: 8px; }
+            .metadata { font-size: 12px; color: #6b7280; margin-bottom: 8px; }
+            .stats { font-size: 12px; color: #374151; }
+            .tags { margin-top: 8px; }
+            .tag { background-color: #dbeafe; color: #1e40af; padding: 2px 8px; border-radius: 12px; font-size: 12px; margin-right: 4px; }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>Tech Search Results</h1>
+                <p>Here are your requested search results from Tech Search Hub</p>
+            </div>
+    """
+
+
+def concat_email_html(results):
+    html = STYLE
+
+    for result in results:
+        html += f"""
+            <div class="result-card">
+                <span class="source-badge {'reddit' if result['source'] == 'reddit' else 'stackoverflow'}">
+                    {result['source'].title()}
+                </span>
+                <div class="title">{result['title']}</div>
+                <div class="metadata">
+                    {'Posted by ' + result['author'] if 'author' in result else 'Asked by ' + result['owner']['name']} •
+                    {result['created_at']}
+                </div>
+        """
+
+        if result['source'] == 'reddit':
+            html += f"""
+                <div class="stats">
+                    🔼 {result['score']} •
+                    💬 {result['num_comments']} comments •
+                    {round(result['upvote_ratio'] * 100)}% upvoted
+                </div>
+            """
+        else:
+            html += f"""
+                <div class="stats">
+                    🔼 {result['score']} •
+                    💬 {result['answer_count']} answers •
+                    👁️ {result['view_count']} views
+                </div>
+                <div class="tags">
+                    {''.join([f'<span class="tag">{tag}</span>' for tag in result['tags']])}
+                </div>
+            """
+
+        html += "</div>"
+
+    html += """
+        </div>
+    </body>
+    </html>
+    """
+    return html
+
+
+def digest(count, seed=5):
+    """Interleaved Reddit and Stack Overflow results as the client sends them"""
+    half = count // 2
+    reddit = [{**post, 'source': 'reddit'} for post in reddit_results(count - half, seed)['results']]
+    stackoverflow = [
+        {key: value for key, value in question.items() if key != 'top_answer'} | {'source': 'stackoverflow'}
+        for question in stackoverflow_results(half, seed + 1, paragraphs=1)['results']
+    ]
+    results = reddit + stackoverflow
+    random.Random(seed).shuffle(results)
+    return results
+
+
+def with_changed_scores(results, fraction, seed):
+    """Copy of results where a fraction of items have new vote counts, as on a later send"""
+    rng = random.Random(seed)
+    return [
+        {**result, 'score': result['score'] + 1} if rng.random() < fraction else result
+        for result in results
+    ]
+
+
+def normalized(html):
+    return re.sub(r'\s+', ' ', html).strip()
+
+
+def timed_ms(fn, repeat):
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return round(samples[len(samples) // 2], 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--changed', type=float, default=0.1,
+                        help='fraction of results whose score changed between sends')
+    args = parser.parse_args()
+
+    results = digest(args.results)
+    renderer = EmailRenderer(max_fragments=args.results * 4)
+
+    html, text = renderer.render(results, 'python flask')
+    mismatch = normalized(html) != normalized(concat_email_html(results))
+
+    def cold(_):
+        renderer.fragments.clear()
+        renderer.render(results, 'python flask')
+
+    concat_ms = timed_ms(lambda _: concat_email_html(results), args.repeat)
+    cold_ms = timed_ms(cold, args.repeat)
+    renderer.render(results, 'python flask')
+    warm_ms = timed_ms(lambda _: renderer.render(results, 'python flask'), args.repeat)
+    changed = [with_changed_scores(results, args.changed, seed) for seed in range(args.repeat)]
+    partial_ms = timed_ms(lambda i: renderer.render(changed[i], 'python flask'), args.repeat)
+
+    print(json.dumps({
+        'results': args.results,
+        'html_bytes': len(html),
+        'text_bytes': len(text),
+        'output_mismatch': mismatch,
+        'concat_ms': concat_ms,
+        'template_cold_ms': cold_ms,
+        'template_warm_ms': warm_ms,
+        'template_changed_ms': partial_ms,
+        'changed_fraction': args.changed
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""In-process stand-in for the slice of pymongo that MongoCache uses.
+
+Documents are kept in dicts and deep-copied on the way in and out, which keeps
+the copying cost of a real driver without any network or server.
+"""
+from collections import Counter
+import copy
+import threading
+
+
+def _get(doc, dotted):
+    value = doc
+    for part in dotted.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = _get(doc, field)
+        if isinstance(condition, dict) and any(key.startswith('$') for key in condition):
+            for op, operand in condition.items():
+                if op == '$in' and value not in operand:
+                    return False
+                if op == '$gt' and not (value is not None and value > operand):
+                    return False
+                if op == '$lt' and not (value is not None and value < operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    fields = {field for field, include in projection.items() if include}
+    return {key: copy.deepcopy(value) for key, value in doc.items() if key in fields or key == '_id'}
+
+
+class FakeCollection:
+    def __init__(self, name, stats):
+        self.name = name
+        self._docs = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = stats
+
+    def _key(self, doc):
+        if '_id' not in doc:
+            self._next_id += 1
+            doc['_id'] = self._next_id
+        return doc['_id']
+
+    def create_index(self, keys, **kwargs):
+        return '_'.join(f"{field}_{direction}" for field, direction in keys)
+
+    def find(self, query=None, projection=None):
+        self._stats['find'] += 1
+        with self._lock:
+            if query and isinstance(query.get('_id'), dict) and '$in' in query['_id'] and len(query) == 1:
+                docs = [self._docs[key] for key in query['_id']['$in'] if key in self._docs]
+            else:
+                docs = [doc for doc in self._docs.values() if _matches(doc, query or {})]
+            return [_project(doc, projection) for doc in docs]
+
+    def find_one(self, query=None, projection=None):
+        self._stats['find_one'] += 1
+        with self._lock:
+            for doc in self._docs.values():
+                if _matches(doc, query or {}):
+                    return _project(doc, projection)
+        return None
+
+    def _apply(self, doc, update):
+        for field, value in update.get('$set', {}).items():
+            target = doc
+            parts = field.split('.')
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = copy.deepcopy(value)
+        for field in update.get('$unset', {}):
+            doc.pop(field, None)
+
+    def update_one(self, query, update, upsert=False):
+        self._stats['update_one'] += 1
+        with self._lock:
+            self._update(query, update, upsert)
+
+    def _update(self, query, update, upsert):
+        if set(query) == {'_id'} and not isinstance(query['_id'], dict):
+            doc = self._docs.get(query['_id'])
+        else:
+            doc = next((doc for doc in self._docs.values() if _matches(doc, query)), None)
+
+        if doc is None:
+            if not upsert:
+                return
+            doc = {field: value for field, value in query.items() if not isinstance(value, dict)}
+            self._apply(doc, update)
+            self._docs[self._key(doc)] = doc
+        else:
+            self._apply(doc, update)
+
+    def bulk_write(self, operations, ordered=True):
+        self._stats['bulk_write'] += 1
+        with self._lock:
+            for operation in operations:
+                # pymongo.UpdateOne keeps its arguments in these attributes
+                self._update(operation._filter, operation._doc, operation._upsert)
+
+    def delete_many(self, query):
+        self._stats['delete_many'] += 1
+        with self._lock:
+            for key in [key for key, doc in self._docs.items() if _matches(doc, query)]:
+                del self._docs[key]
+
+    def count(self):
+        with self._lock:
+            return len(self._docs)
+
+
+class FakeDatabase:
+    def __init__(self, stats):
+        self._collections = {}
+        self._stats = stats
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name, self._stats)
+        return self._collections[name]
+
+    def command(self, *args, **kwargs):
+        return {'ok': 1}
+
+
+class FakeMongoClient:
+    """Drop-in for pymongo.MongoClient; every client shares one process-wide store"""
+
+    stats = Counter()
+    _databases = {}
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = FakeDatabase(self.stats)
+            return self._databases[name]
@@ -0,0 +1,250 @@
+"""Local HTTP stand-ins for the Reddit and StackExchange endpoints the searchers call.
+
+Responses are deterministic per query and shaped like the real APIs. Latency,
+error rate and payload sizes are configurable, and every request is counted
+so benchmarks can report how many upstream calls a workload needed.
+"""
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import json
+import random
+import threading
+import time
+import zlib
+
+from benchmarks.fixtures import WORDS, answer_body
+
+BASE_EPOCH = 1700000000
+
+
+def _rng(*parts):
+    return random.Random(zlib.crc32('|'.join(str(part) for part in parts).encode()))
+
+
+def _text(rng, chars):
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+class FakeUpstream:
+    """Threaded HTTP server whose routes are methods returning (status, body)"""
+
+    name = 'upstream'
+
+    def __init__(self, latency_ms: float = 20, jitter_ms: float = 5, error_rate: float = 0.0, seed: int = 7):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self) -> str:
+        """Serve on an ephemeral localhost port and return the base URL"""
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                upstream._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f'fake-{self.name}', daemon=True)
+        self._thread.start()
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def snapshot(self) -> Counter:
+        with self._lock:
+            return Counter(self.calls)
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        url = urlparse(handler.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            failed = self._random.random() < self.error_rate
+
+        time.sleep(delay)
+        kind, status, body = self.route(url.path, params)
+        if failed:
+            status, body = 503, {'error': 'injected failure'}
+
+        with self._lock:
+            self.calls[kind] += 1
+            if status >= 400:
+                self.calls[f'{kind}_errors'] += 1
+
+        payload = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def route(self, path, params):
+        raise NotImplementedError
+
+
+class FakeReddit(FakeUpstream):
+    """/search.json, /r/<subreddit>/search.json and /api/info.json"""
+
+    name = 'reddit'
+
+    def __init__(self, results_per_query: int = 250, selftext_chars: int = 600, **kwargs):
+        super().__init__(**kwargs)
+        self.results_per_query = results_per_query
+        self.selftext_chars = selftext_chars
+
+    def _post(self, query, position):
+        rng = _rng('reddit', query, position)
+        post_id = f"{zlib.crc32(query.encode()) & 0xffff:04x}{position:05d}"
+        return {
+            'id': post_id,
+            'name': f"t3_{post_id}",
+            'title': _text(rng, 60),
+            'subreddit': rng.choice(['python', 'flask', 'learnpython', 'programming']),
+            'author': f"redditor{rng.randint(1, 99999)}",
+            'created_utc': BASE_EPOCH - position * 3600,
+            'score': rng.randint(0, 5000),
+            'upvote_ratio': round(rng.uniform(0.5, 1.0), 2),
+            'num_comments': rng.randint(0, 800),
+            'permalink': f"/r/python/comments/{post_id}/",
+            'is_self': True,
+            'selftext': _text(rng, self.selftext_chars),
+            'link_flair_text': None,
+            'domain': 'self.python',
+            'thumbnail': 'self'
+        }
+
+    def route(self, path, params):
+        if path.endswith('/api/info.json'):
+            children = []
+            for fullname in params.get('id', '').split(','):
+                if fullname.startswith('t3_') and len(fullname) > 8:
+                    post_id = fullname[3:]
+                    rng = _rng('info', post_id)
+                    children.append({'kind': 't3', 'data': {
+                        'id': post_id,
+                        'score': rng.randint(0, 5000),
+                        'upvote_ratio': round(rng.uniform(0.5, 1.0), 2),
+                        'num_comments': rng.randint(0, 800)
+                    }})
+            return 'reddit_info', 200, {'kind': 'Listing', 'data': {'children': children}}
+
+        if path.endswith('/search.json'):
+            query = params.get('q', '')
+            limit = min(int(params.get('limit', 25)), 100)
+            start = int(params['after'][-5:]) + 1 if params.get('after') else 0
+            end = min(start + limit, self.results_per_query)
+            posts = [self._post(query, position) for position in range(start, end)]
+            return 'reddit_search', 200, {'kind': 'Listing', 'data': {
+                'after': posts[-1]['name'] if posts and end < self.results_per_query else None,
+                'before': None,
+                'children': [{'kind': 't3', 'data': post} for post in posts]
+            }}
+
+        return 'reddit_other', 404, {'error': 404}
+
+
+class FakeStackExchange(FakeUpstream):
+    """/2.3/search, /2.3/search/advanced, /2.3/questions/{ids} and /2.3/questions/{ids}/answers"""
+
+    name = 'stackexchange'
+
+    def __init__(self, results_per_query: int = 300, answer_paragraphs: int = 6, **kwargs):
+        super().__init__(**kwargs)
+        self.results_per_query = results_per_query
+        self.answer_paragraphs = answer_paragraphs
+        self.quota_remaining = 10000000
+
+    def _wrap(self, items, has_more=False):
+        with self._lock:
+            self.quota_remaining -= 1
+            quota = self.quota_remaining
+        return {'items': items, 'has_more': has_more, 'quota_max': 10000000, 'quota_remaining': quota}
+
+    def _question(self, query, position):
+        rng = _rng('question', query, position)
+        question_id = 10000000 + (zlib.crc32(query.encode()) & 0xfff) * 1000 + position
+        return {
+            'question_id': question_id,
+            'title': _text(rng, 70),
+            'link': f"https://stackoverflow.com/questions/{question_id}",
+            'score': rng.randint(-2, 900),
+            'answer_count': rng.randint(0, 12),
+            'is_answered': True,
+            'view_count': rng.randint(10, 100000),
+            'tags': rng.sample(WORDS, 3),
+            'creation_date': BASE_EPOCH - position * 7200,
+            'last_activity_date': BASE_EPOCH - position * 600,
+            'owner': {
+                'display_name': f"user{rng.randint(1, 99999)}",
+                'reputation': rng.randint(1, 50000),
+                'link': 'https://stackoverflow.com/users/1'
+            }
+        }
+
+    def route(self, path, params):
+        if path.endswith('/search') or path.endswith('/search/advanced'):
+            query = params.get('q', '')
+            pagesize = min(int(params.get('pagesize', 30)), 100)
+            page = int(params.get('page', 1))
+            start = (page - 1) * pagesize
+            end = min(start + pagesize, self.results_per_query)
+            if params.get('fromdate'):
+                # Incremental refreshes find nothing new
+                end = start
+            items = [self._question(query, position) for position in range(start, end)]
+            return 'se_search', 200, self._wrap(items, end < self.results_per_query)
+
+        if '/questions/' in path:
+            segments = path.split('/questions/', 1)[1].split('/')
+            question_ids = [int(question_id) for question_id in segments[0].split(';') if question_id]
+
+            if len(segments) > 1 and segments[1] == 'answers':
+                items = []
+                for question_id in question_ids:
+                    rng = _rng('answer', question_id)
+                    items.append({
+                        'answer_id': question_id * 10 + 1,
+                        'question_id': question_id,
+                        'score': rng.randint(0, 900),
+                        'is_accepted': rng.random() < 0.5,
+                        'body': answer_body(rng, self.answer_paragraphs)
+                    })
+                items.sort(key=lambda answer: answer['score'], reverse=True)
+                return 'se_answers', 200, self._wrap(items)
+
+            items = []
+            for question_id in question_ids:
+                rng = _rng('counters', question_id)
+                items.append({
+                    'question_id': question_id,
+                    'score': rng.randint(-2, 900),
+                    'answer_count': rng.randint(0, 12),
+                    'is_answered': True,
+                    'view_count': rng.randint(10, 100000),
+                    'last_activity_date': BASE_EPOCH
+                })
+            return 'se_questions', 200, self._wrap(items)
+
+        return 'se_other', 404, {'error_id': 404}
@@ -0,0 +1,93 @@
+"""Synthetic search payloads shaped like RedditSearcher / StackOverflowSearcher output"""
+from datetime import datetime, timedelta
+import random
+
+WORDS = ('python flask request session cache mongo index query thread async error '
+         'import module install version config deploy server client response timeout').split()
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def answer_body(rng, paragraphs=6, code_blocks=3):
+    """HTML answer body similar to what the StackExchange API returns with filter=withbody"""
+    parts = []
+    for i in range(paragraphs):
+        parts.append(f"<p>{_sentence(rng, 30)} <code>{rng.choice(WORDS)}()</code> {_sentence(rng, 20)}</p>")
+        if i < code_blocks:
+            lines = '\n'.join(f"{rng.choice(WORDS)} = {rng.choice(WORDS)}({rng.randint(0, 99)})" for _ in range(8))
+            parts.append(f"<pre><code>{lines}</code></pre>")
+    parts.append('<ul>' + ''.join(f"<li>{_sentence(rng, 8)}</li>" for _ in range(4)) + '</ul>')
+    return '\n'.join(parts)
+
+
+def stackoverflow_question(rng, question_id, paragraphs=6):
+    created = datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 400000))
+    return {
+        'id': question_id,
+        'title': _sentence(rng, 8),
+        'link': f"https://stackoverflow.com/questions/{question_id}",
+        'score': rng.randint(-2, 500),
+        'answer_count': rng.randint(0, 12),
+        'is_answered': True,
+        'view_count': rng.randint(10, 100000),
+        'tags': rng.sample(WORDS, 3),
+        'created_at': created.isoformat(),
+        'last_activity': created.isoformat(),
+        'owner': {
+            'name': f"user{rng.randint(1, 99999)}",
+            'reputation': rng.randint(1, 50000),
+            'link': f"https://stackoverflow.com/users/{rng.randint(1, 99999)}"
+        },
+        'top_answer': {
+            'score': rng.randint(0, 900),
+            'is_accepted': rng.random() < 0.5,
+            'body': answer_body(rng, paragraphs),
+            'link': f"https://stackoverflow.com/a/{question_id * 10}"
+        }
+    }
+
+
+def reddit_post(rng, index):
+    created = datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 400000))
+    post_id = f"p{index:06x}"
+    return {
+        'id': post_id,
+        'title': _sentence(rng, 10),
+        'subreddit': rng.choice(['python', 'flask', 'learnpython', 'programming']),
+        'author': f"redditor{rng.randint(1, 99999)}",
+        'created_at': created.isoformat(),
+        'score': rng.randint(0, 5000),
+        'upvote_ratio': round(rng.uniform(0.5, 1.0), 2),
+        'num_comments': rng.randint(0, 800),
+        'url': f"https://reddit.com/r/python/comments/{post_id}/",
+        'is_self': True,
+        'selftext': ' '.join(_sentence(rng, 20) for _ in range(rng.randint(2, 30))),
+        'link_flair_text': None,
+        'domain': 'self.python'
+    }
+
+
+def stackoverflow_results(count=25, seed=1, paragraphs=6):
+    rng = random.Random(seed)
+    questions = [stackoverflow_question(rng, 1000 + i, paragraphs) for i in range(count)]
+    return {
+        'query': 'python flask',
+        'tags': None,
+        'total_results': len(questions),
+        'has_more': True,
+        'quota_remaining': 9000,
+        'results': questions
+    }
+
+
+def reddit_results(count=25, seed=2):
+    rng = random.Random(seed)
+    posts = [reddit_post(rng, i) for i in range(count)]
+    return {
+        'query': 'python flask',
+        'subreddit': None,
+        'total_results': len(posts),
+        'results': posts
+    }
@@ -0,0 +1,268 @@
+"""Drive the Flask routes against local fake upstreams and report latency, throughput and cache use.
+
+Runs with no network: Reddit and StackExchange are served on localhost by
+benchmarks.fake_upstreams and MongoDB is replaced by benchmarks.fake_mongo.
+Prints one JSON report covering cold start (import and first request, in a
+fresh interpreter) and every scenario at every concurrency level.
+
+    python benchmarks/search_benchmark.py [--concurrency 1,8,32] [--requests 200]
+        [--latency-ms 30] [--error-rate 0] [--scenarios search_miss,search_hit]
+        [--output report.json]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_mongo import FakeMongoClient
+from benchmarks.fake_upstreams import FakeReddit, FakeStackExchange
+
+HOT_QUERIES = [f"hot query {i}" for i in range(10)]
+
+
+def benchmark_env(reddit_url, stackexchange_url):
+    """Environment that points the app at the fakes and lifts client-side rate limits"""
+    return {
+        'REDDIT_BASE_URL': reddit_url,
+        'STACKEXCHANGE_BASE_URL': f"{stackexchange_url}/2.3",
+        'MONGO_URL': 'mongodb://benchmark',
+        'STACKEXCHANGE_RATE_PER_SECOND': '1000000',
+        'STACKEXCHANGE_BURST': '1000000',
+        'REDDIT_BATCH_RATE_PER_SECOND': '1000000',
+        'REDDIT_BATCH_BURST': '1000000'
+    }
+
+
+def import_app():
+    """Import app with MongoDB swapped for the in-process stand-in"""
+    import mongo_cache
+    mongo_cache.MongoClient = FakeMongoClient
+    import app
+    return app
+
+
+def cold_start_probe():
+    """Child process mode: time `import app` and the first request, print JSON"""
+    started = time.perf_counter()
+    app_module = import_app()
+    import_seconds = time.perf_counter() - started
+
+    client = app_module.app.test_client()
+    started = time.perf_counter()
+    response = client.get('/api/search?q=cold+start+probe')
+    first_request_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    client.get('/api/search?q=cold+start+probe')
+    second_request_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        'import_ms': round(import_seconds * 1000, 2),
+        'first_request_ms': round(first_request_seconds * 1000, 2),
+        'first_request_status': response.status_code,
+        'second_request_ms': round(second_request_seconds * 1000, 2)
+    }))
+
+
+def measure_cold_start(env, runs):
+    samples = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--cold-start-probe'],
+            env={**os.environ, **env},
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    report = {'runs': runs}
+    for field in ('import_ms', 'first_request_ms', 'second_request_ms'):
+        values = sorted(sample[field] for sample in samples)
+        report[field] = {'median': values[len(values) // 2], 'max': values[-1]}
+    return report
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def scenario_requests(name, concurrency):
+    """(warm-up requests, request factory) for a scenario; requests are (method, path, json)"""
+    unique = f"c{concurrency}"
+    hot_search = [('GET', f"/api/search?q={q}", None) for q in HOT_QUERIES]
+
+    if name == 'search_miss':
+        return [], lambda i: ('GET', f"/api/search?q=miss+{unique}+{i}", None)
+    if name == 'search_hit':
+        return hot_search, lambda i: ('GET', f"/api/search?q={HOT_QUERIES[i % len(HOT_QUERIES)]}", None)
+    if name == 'search_mixed':
+        # Roughly 80% repeat traffic, 20% new queries
+        return hot_search, lambda i: (
+            ('GET', f"/api/search?q=mixed+{unique}+{i}", None) if i % 5 == 0
+            else ('GET', f"/api/search?q={HOT_QUERIES[i % len(HOT_QUERIES)]}", None)
+        )
+    if name == 'stackoverflow_hit':
+        warm = [('GET', f"/api/stackoverflow/search?q={q}", None) for q in HOT_QUERIES]
+        return warm, lambda i: ('GET', f"/api/stackoverflow/search?q={HOT_QUERIES[i % len(HOT_QUERIES)]}", None)
+    if name == 'results_page':
+        return hot_search, lambda i: (
+            'GET',
+            f"/api/results?q={HOT_QUERIES[i % len(HOT_QUERIES)]}&sort=score&page_size=20&offset={(i % 3) * 20}",
+            None
+        )
+    if name == 'async_search_miss':
+        return [], lambda i: ('GET', f"/api/async/search?q=async+{unique}+{i}", None)
+    if name == 'batch':
+        return hot_search, lambda i: ('POST', '/api/search/batch', {'queries': [
+            {'q': HOT_QUERIES[(i + j) % len(HOT_QUERIES)]} if j % 2 else {'q': f"batch {unique} {i} {j}"}
+            for j in range(10)
+        ]})
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+SCENARIOS = ('search_miss', 'search_hit', 'search_mixed', 'stackoverflow_hit',
+             'results_page', 'async_search_miss', 'batch')
+
+
+def run_scenario(app_module, base_url, fakes, name, concurrency, total_requests):
+    app_module.cache.clear_cache()
+    app_module.result_indexes.clear()
+
+    warm_up, make_request = scenario_requests(name, concurrency)
+    with requests.Session() as session:
+        for method, path, body in warm_up:
+            session.request(method, base_url + path, json=body)
+
+    upstream_before = {fake.name: fake.snapshot() for fake in fakes}
+    memory_before = app_module.cache.memory.stats()
+    mongo_before = FakeMongoClient.stats.copy()
+
+    local = threading.local()
+
+    def send(i):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        method, path, body = make_request(i)
+        started = time.perf_counter()
+        response = local.session.request(method, base_url + path, json=body)
+        elapsed = time.perf_counter() - started
+        return elapsed, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(send, range(total_requests)))
+    wall_seconds = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, _ in outcomes)
+    memory_after = app_module.cache.memory.stats()
+    hits = memory_after['hits'] - memory_before['hits']
+    misses = memory_after['misses'] - memory_before['misses']
+
+    upstream_calls = {}
+    for fake in fakes:
+        delta = fake.snapshot() - upstream_before[fake.name]
+        upstream_calls[fake.name] = dict(delta)
+
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'errors': sum(1 for _, status in outcomes if status >= 400),
+        'throughput_rps': round(total_requests / wall_seconds, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'max': round(latencies[-1], 2)
+        },
+        'upstream_calls': upstream_calls,
+        'upstream_calls_per_request': round(
+            sum(sum(calls.values()) for calls in upstream_calls.values()) / total_requests, 3
+        ),
+        'memory_cache': {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0
+        },
+        'mongo_ops': dict(FakeMongoClient.stats - mongo_before),
+        'circuit_breakers': {
+            platform: breaker.state for platform, breaker in app_module.circuit_breakers.items()
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', default='1,8,32',
+                        help='comma-separated client concurrency levels')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario and level')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--latency-ms', type=float, default=30, help='fake upstream latency')
+    parser.add_argument('--jitter-ms', type=float, default=5)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream calls failing with 503')
+    parser.add_argument('--reddit-selftext', type=int, default=600, help='characters of selftext per post')
+    parser.add_argument('--answer-paragraphs', type=int, default=6, help='paragraphs per answer body')
+    parser.add_argument('--cold-starts', type=int, default=3, help='fresh-interpreter startup samples')
+    parser.add_argument('--output', help='also write the report to this file')
+    parser.add_argument('--cold-start-probe', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_start_probe:
+        cold_start_probe()
+        return
+
+    upstream_options = {'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'error_rate': args.error_rate}
+    reddit = FakeReddit(selftext_chars=args.reddit_selftext, **upstream_options)
+    stackexchange = FakeStackExchange(answer_paragraphs=args.answer_paragraphs, **upstream_options)
+    fakes = (reddit, stackexchange)
+    env = benchmark_env(reddit.start(), stackexchange.start())
+    os.environ.update(env)
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'cold_start_probe'},
+        'cold_start': measure_cold_start(env, args.cold_starts) if args.cold_starts else None,
+        'scenarios': []
+    }
+
+    from werkzeug.serving import make_server
+
+    app_module = import_app()
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='benchmark-app', daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        for name in args.scenarios.split(','):
+            for concurrency in (int(level) for level in args.concurrency.split(',')):
+                report['scenarios'].append(
+                    run_scenario(app_module, base_url, fakes, name, concurrency, args.requests)
+                )
+    finally:
+        server.shutdown()
+        for fake in fakes:
+            fake.stop()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
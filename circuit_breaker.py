@@ -0,0 +1,128 @@
+from collections import deque
+from typing import Dict, Optional
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker driven by the failure rate over a sliding window"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self,
+                 name: str,
+                 failure_rate_threshold: float = 0.5,
+                 window_seconds: float = 60,
+                 min_calls: int = 5,
+                 open_seconds: float = 30,
+                 half_open_max_calls: int = 1):
+
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_since = 0.0
+        # (timestamp, succeeded) for calls inside the window
+        self._outcomes = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a call may go upstream now; half-open admits a limited number of probes"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    return False
+                self._state = self.HALF_OPEN
+                self._half_open_calls = 0
+                self._half_open_since = now
+
+            if self._state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    # Probes that never report back (cancelled, abandoned) must not
+                    # hold the breaker half-open for good; admit new ones after a while
+                    if now - self._half_open_since < self.open_seconds:
+                        return False
+                    self._half_open_calls = 0
+                    self._half_open_since = now
+                self._half_open_calls += 1
+
+            return True
+
+    def record_outcome(self, succeeded: Optional[bool]):
+        """Record a finished call; None means it ended without an outcome and only frees its probe slot"""
+        if succeeded is None:
+            self.release()
+        elif succeeded:
+            self.record_success()
+        else:
+            self.record_failure()
+
+    def release(self):
+        """Give back a half-open probe slot without counting the call either way"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+
+            self._outcomes.append((now, False))
+            self._trim(now)
+
+            failures = sum(1 for _, succeeded in self._outcomes if not succeeded)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate_threshold:
+                self._open(now)
+
+    def _open(self, now: float):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._half_open_calls = 0
+        self._outcomes.clear()
+
+    def stats(self) -> Dict:
+        state = self.state
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            failures = sum(1 for _, succeeded in self._outcomes if not succeeded)
+            return {
+                'name': self.name,
+                'state': state,
+                'calls_in_window': len(self._outcomes),
+                'failures_in_window': failures,
+                'retry_in_seconds': round(max(0.0, self.open_seconds - (now - self._opened_at)), 3)
+                if state == self.OPEN else 0.0
+            }
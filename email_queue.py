@@ -0,0 +1,234 @@
+from collections import OrderedDict
+from email.message import Message
+from typing import Callable, Dict, Optional
+import queue
+import smtplib
+import threading
+import time
+import uuid
+import os
+import dotenv
+
+dotenv.load_dotenv()
+
+
+class EmailQueueFullError(Exception):
+    """Raised when the delivery queue is at capacity"""
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies, rejected credentials and missing server features will not succeed on retry"""
+    if isinstance(error, (smtplib.SMTPAuthenticationError,
+                          smtplib.SMTPNotSupportedError,
+                          smtplib.SMTPRecipientsRefused)):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class EmailQueue:
+    """Bounded queue of outgoing messages sent by one worker over a reused SMTP connection"""
+
+    def __init__(self,
+                 host: str = os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+                 port: int = int(os.getenv('SMTP_PORT', 465)),
+                 use_ssl: bool = os.getenv('SMTP_SSL', 'true').lower() == 'true',
+                 username: Optional[str] = os.getenv('MAIL_USERNAME'),
+                 password: Optional[str] = os.getenv('MAIL_PASSWORD'),
+                 max_queue_size: int = int(os.getenv('EMAIL_QUEUE_SIZE', 100)),
+                 max_attempts: int = int(os.getenv('EMAIL_MAX_ATTEMPTS', 4)),
+                 backoff_seconds: float = float(os.getenv('EMAIL_RETRY_BACKOFF_SECONDS', 2)),
+                 idle_seconds: float = float(os.getenv('SMTP_IDLE_SECONDS', 60)),
+                 timeout: float = float(os.getenv('SMTP_TIMEOUT', 30)),
+                 max_jobs: int = int(os.getenv('EMAIL_JOB_HISTORY', 1000)),
+                 smtp_factory: Optional[Callable[[], smtplib.SMTP]] = None):
+
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self.smtp_factory = smtp_factory or self._connect
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._jobs: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.connections = 0
+
+    def submit(self, message: Message) -> str:
+        """Queue a message and return its job id; raises EmailQueueFullError when at capacity"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'to': message['To'],
+            'attempts': 0,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+
+        with self._lock:
+            self._ensure_worker()
+            try:
+                self._queue.put_nowait((job_id, message))
+            except queue.Full:
+                raise EmailQueueFullError('Email queue is full. Please try again later.')
+            self._jobs[job_id] = job
+            # Finished jobs beyond the history limit are forgotten oldest first
+            while len(self._jobs) > self.max_jobs:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest['status'] in ('queued', 'sending', 'retrying'):
+                    break
+                del self._jobs[oldest_id]
+
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_queue_size': self._queue.maxsize,
+                'connected': self._smtp is not None,
+                'sent': self.sent,
+                'failed': self.failed,
+                'retries': self.retries,
+                'connections': self.connections
+            }
+
+    def close(self, timeout: float = 5):
+        """Stop the worker after the message in hand and close the connection"""
+        self._stopping.set()
+        worker = self._worker
+        if worker is not None:
+            # Wake a worker idling in get() instead of waiting out idle_seconds
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            worker.join(timeout)
+        self._disconnect()
+
+    def _ensure_worker(self):
+        # Started on first use so importing the app opens no connection
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='email-queue', daemon=True)
+            self._worker.start()
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            # Extensions are only known after EHLO; has_extn is always false before it
+            smtp.ehlo()
+            if smtp.has_extn('starttls'):
+                smtp.starttls()
+                smtp.ehlo()
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            smtp = self.smtp_factory()
+            with self._lock:
+                self._smtp = smtp
+                self.connections += 1
+        return self._smtp
+
+    def _disconnect(self):
+        with self._lock:
+            smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                item = self._queue.get(timeout=self.idle_seconds)
+            except queue.Empty:
+                # Servers drop idle sessions; close ours first rather than find out on the next send
+                self._disconnect()
+                continue
+            if item is None:
+                self._queue.task_done()
+                continue
+            job_id, message = item
+
+            try:
+                self._deliver(job_id, message)
+            except Exception as e:
+                print(f"Email delivery error: {str(e)}")
+                self._update(job_id, status='failed', error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, job_id: str, message: Message):
+        for attempt in range(1, self.max_attempts + 1):
+            self._update(job_id, status='sending', attempts=attempt)
+            try:
+                self._connection().send_message(message)
+            except Exception as e:
+                # A failed exchange can leave the session mid-transaction, so
+                # the next attempt, or the next message, starts on a fresh one
+                self._disconnect()
+                if _is_permanent(e) or attempt == self.max_attempts:
+                    print(f"Error sending email: {str(e)}")
+                    with self._lock:
+                        self.failed += 1
+                    self._update(job_id, status='failed', error=str(e))
+                    return
+
+                with self._lock:
+                    self.retries += 1
+                self._update(job_id, status='retrying', error=str(e))
+                if self._stopping.wait(self.backoff_seconds * 2 ** (attempt - 1)):
+                    self._update(job_id, status='failed', error='Shut down before delivery')
+                    return
+                continue
+
+            with self._lock:
+                self.sent += 1
+            self._update(job_id, status='sent', error=None)
+            return
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_default_queue() -> EmailQueue:
+    """Return the process-wide EmailQueue, creating it on first use"""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = EmailQueue()
+        return _default_queue
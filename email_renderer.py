@@ -0,0 +1,99 @@
+from typing import Dict, List, Optional, Tuple
+import os
+import threading
+import dotenv
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+
+from memory_cache import MemoryCache
+
+dotenv.load_dotenv()
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
+
+# Every field the card templates read; a fragment is reused only when all of them match
+FRAGMENT_FIELDS = (
+    'source', 'id', 'title', 'author', 'created_at', 'score', 'num_comments',
+    'upvote_ratio', 'answer_count', 'view_count', 'url', 'link'
+)
+
+
+class EmailRenderer:
+    """Result digests from precompiled templates, with each result card rendered once and reused"""
+
+    def __init__(self,
+                 max_fragments: int = int(os.getenv('EMAIL_FRAGMENT_CACHE_SIZE', 5000)),
+                 ttl_seconds: float = float(os.getenv('EMAIL_FRAGMENT_TTL_SECONDS', 3600))):
+
+        environment = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            autoescape=select_autoescape(['html']),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=False
+        )
+        # Compiled once here; rendering never touches the loader again
+        self.page_html = environment.get_template('results.html')
+        self.page_text = environment.get_template('results.txt')
+        self.card_html = environment.get_template('result_card.html')
+        self.card_text = environment.get_template('result_card.txt')
+
+        self.fragments = MemoryCache(
+            max_entries=max_fragments,
+            max_bytes=64 * 1024 * 1024,
+            ttl_seconds=ttl_seconds
+        )
+
+    def fragment_key(self, result: Dict) -> Optional[Tuple]:
+        # Results come from the client, so the key covers everything a card shows
+        # rather than trusting (source, id) to identify its content
+        if result.get('id') is None:
+            return None
+        owner = result.get('owner')
+        key = (
+            tuple(map(result.get, FRAGMENT_FIELDS))
+            + ('author' in result, owner.get('name') if isinstance(owner, dict) else owner)
+            + (tuple(result.get('tags') or ()),)
+        )
+        try:
+            hash(key)
+        except TypeError:
+            # Nested values in unexpected fields; render without caching
+            return None
+        return key
+
+    def render_result(self, result: Dict) -> Tuple[str, str]:
+        """HTML and plain-text card for one result"""
+        key = self.fragment_key(result)
+        if key is not None:
+            cached = self.fragments.get(key)
+            if cached is not None:
+                return cached
+
+        fragment = (self.card_html.render(result=result), self.card_text.render(result=result))
+        if key is not None:
+            self.fragments.set(key, fragment)
+        return fragment
+
+    def render(self, results: List[Dict], query: Optional[str] = None) -> Tuple[str, str]:
+        """HTML and plain-text bodies of a results email"""
+        fragments = [self.render_result(result) for result in results]
+        html = self.page_html.render(cards=Markup(''.join(html for html, _ in fragments)), query=query)
+        text = self.page_text.render(cards='\n'.join(text for _, text in fragments), query=query)
+        return html, text
+
+    def stats(self) -> Dict:
+        return self.fragments.stats()
+
+
+_default_renderer = None
+_default_renderer_lock = threading.Lock()
+
+
+def get_default_renderer() -> EmailRenderer:
+    """Return the process-wide EmailRenderer, creating it on first use"""
+    global _default_renderer
+    with _default_renderer_lock:
+        if _default_renderer is None:
+            _default_renderer = EmailRenderer()
+        return _default_renderer
@@ -0,0 +1,189 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+
+# Seconds; spans cache hits (sub-millisecond) to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Stage timings of the current request, only set while Server-Timing is enabled
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar('request_timings', default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with labels; observe() is a bisect and one locked increment"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                labels = _format_labels(key + (('le', _format_value(float(bound))),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """Counters and histograms for the search hot path, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            'search_stage_duration_seconds', 'Time spent in each search stage by platform'
+        )
+        self.upstream_seconds = Histogram(
+            'upstream_request_duration_seconds', 'Upstream HTTP request latency by host'
+        )
+        self.upstream_responses = Counter(
+            'upstream_responses_total', 'Upstream HTTP responses by host and status code'
+        )
+        self.cache_lookups = Counter(
+            'cache_lookups_total', 'Search cache lookups by platform and result (hit, stale or miss)'
+        )
+        self.request_seconds = Histogram(
+            'http_request_duration_seconds', 'Time to produce a response by route'
+        )
+        self.responses = Counter(
+            'http_responses_total', 'Responses by route and status code'
+        )
+        self._metrics = [
+            self.request_seconds, self.responses, self.stage_seconds,
+            self.upstream_seconds, self.upstream_responses, self.cache_lookups
+        ]
+        # (name, type, help, fn) where fn returns [(labels, value), ...]
+        self._callbacks: List[Tuple[str, str, str, Callable]] = []
+
+    @contextmanager
+    def stage(self, name: str, platform: str = ''):
+        """Time a block as one stage of a search"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - started, platform)
+
+    def record_stage(self, name: str, seconds: float, platform: str = ''):
+        self.stage_seconds.observe(seconds, stage=name, platform=platform)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((f"{platform}-{name}" if platform else name, seconds))
+
+    def record_upstream(self, host: str, status, seconds: float):
+        self.upstream_seconds.observe(seconds, host=host)
+        self.upstream_responses.inc(host=host, status=str(status))
+
+    def register_callback(self, name: str, kind: str, help_text: str, fn: Callable[[], Iterable[Tuple[Dict, float]]]):
+        """Add a gauge or counter whose samples are read from fn at scrape time"""
+        self._callbacks.append((name, kind, help_text, fn))
+
+    def start_request_timing(self):
+        """Collect stage timings for the current request; returns a token for finish_request_timing"""
+        return _request_timings.set([])
+
+    def finish_request_timing(self, token, total_seconds: float) -> str:
+        """Server-Timing header value for the stages recorded since start_request_timing"""
+        timings = _request_timings.get() or []
+        _request_timings.reset(token)
+
+        # Stages that ran more than once (e.g. several answer batches) are summed
+        totals: Dict[str, float] = {}
+        for name, seconds in timings:
+            totals[name] = totals.get(name, 0.0) + seconds
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items()]
+        entries.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ', '.join(entries)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, kind, help_text, fn in self._callbacks:
+            try:
+                samples = list(fn())
+            except Exception as e:
+                print(f"Error collecting metric {name}: {str(e)}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+_default_metrics = None
+_default_metrics_lock = threading.Lock()
+
+
+def get_default_metrics() -> Metrics:
+    """Return the process-wide Metrics, creating it on first use"""
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics()
+        return _default_metrics
@@ -1,69 +1,546 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError
+from bson.binary import Binary
 from datetime import datetime, timedelta
 import hashlib
 import json
+import zlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from memory_cache import MemoryCache
 import dotenv
 import os
 dotenv.load_dotenv()
 
+# Parameters that only control how many results a search returns
+SIZE_PARAMS = ('limit', 'pagesize')
+
+# Per-platform fields that change after a post is first seen; they are kept
+# outside the stored post body so they can be updated in place
+VOLATILE_FIELDS = {
+    'reddit': ('score', 'upvote_ratio', 'num_comments'),
+    'stackoverflow': ('score', 'answer_count', 'is_answered', 'view_count', 'last_activity')
+}
+
 
 class MongoCache:
     def __init__(self, connection_string=os.getenv('MONGO_URL'), db_name="search_cache"):
-        self.client = MongoClient(connection_string)
-        self.db = self.client[db_name]
-        self.cache = self.db.search_results
+        # Nothing touches the network here; the client is created on first use and
+        # indexes are built in the background so imports and cold starts stay fast
+        self.connection_string = connection_string
+        self.db_name = db_name
+        self.client = None
+        self.db = None
+        self.cache = None
+        self.posts = None
+        self._connect_lock = threading.Lock()
+        self._indexes_started = False
+        self.indexes_ready = False
+        
+        # While Mongo is unreachable the cache runs on the memory tier alone and
+        # retries the connection after mongo_retry_seconds
+        self.server_selection_timeout_ms = int(os.getenv('MONGO_TIMEOUT_MS', 2000))
+        self.mongo_retry_seconds = float(os.getenv('MONGO_RETRY_SECONDS', 30))
+        self._unavailable_until = 0.0
         
-        # Create indexes for better query performance
-        self.cache.create_index([("query_hash", 1)])
-        self.cache.create_index([("timestamp", 1)])
+        # Results are stored as zlib-compressed JSON unless CACHE_COMPRESSION=none;
+        # documents written in either format are read back transparently
+        self.compression = os.getenv('CACHE_COMPRESSION', 'zlib').lower()
+        self.compression_level = int(os.getenv('CACHE_COMPRESSION_LEVEL', 6))
         
         # Set cache expiration (24 hours by default)
         self.cache_expiration = timedelta(hours=24)
+        
+        # Entries past cache_expiration but younger than stale_expiration are
+        # still served while a background refresh replaces them
+        self.stale_expiration = timedelta(hours=float(os.getenv('CACHE_STALE_HOURS', 72)))
+        self.max_pending_refreshes = int(os.getenv('CACHE_MAX_PENDING_REFRESHES', 32))
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('CACHE_REFRESH_WORKERS', 2))
+        )
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        
+        # In-process tier read before Mongo; its TTL never outlives the Mongo expiration
+        self.memory_ttl_seconds = float(os.getenv('MEMORY_CACHE_TTL_SECONDS', 300))
+        self.memory = MemoryCache(
+            max_entries=int(os.getenv('MEMORY_CACHE_MAX_ENTRIES', 256)),
+            max_bytes=int(os.getenv('MEMORY_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+            ttl_seconds=min(self.memory_ttl_seconds, self.cache_expiration.total_seconds())
+        )
+    
+    def _collection(self):
+        """Return the results collection, connecting on first use; None while Mongo is unavailable"""
+        if time.monotonic() < self._unavailable_until:
+            return None
+        
+        if self.cache is None:
+            with self._connect_lock:
+                if self.cache is None:
+                    try:
+                        self.client = MongoClient(
+                            self.connection_string,
+                            connect=False,
+                            serverSelectionTimeoutMS=self.server_selection_timeout_ms
+                        )
+                    except PyMongoError as e:
+                        self._mark_unavailable(e)
+                        return None
+                    self.db = self.client[self.db_name]
+                    self.posts = self.db.posts
+                    self.cache = self.db.search_results
+        
+        if not self._indexes_started:
+            with self._connect_lock:
+                if not self._indexes_started:
+                    self._indexes_started = True
+                    threading.Thread(target=self._ensure_indexes, name='mongo-cache-indexes', daemon=True).start()
+        
+        return self.cache
+    
+    def _ensure_indexes(self):
+        """Create indexes for better query performance"""
+        try:
+            self.cache.create_index([("query_hash", 1)])
+            self._apply_ttl_index(self.cache, "timestamp")
+            self._apply_ttl_index(self.posts, "updated_at")
+            self.indexes_ready = True
+        except PyMongoError as e:
+            self._indexes_started = False
+            self._mark_unavailable(e)
+    
+    def _ttl_seconds(self):
+        return int(max(self.cache_expiration, self.stale_expiration).total_seconds())
+    
+    def _apply_ttl_index(self, collection, field):
+        """Let Mongo expire documents once they pass the stale limit"""
+        try:
+            collection.create_index([(field, 1)], expireAfterSeconds=self._ttl_seconds())
+        except OperationFailure as e:
+            # 85/86: an older plain or differently timed index exists on the field
+            if e.code not in (85, 86):
+                raise
+            self.db.command(
+                'collMod',
+                collection.name,
+                index={'keyPattern': {field: 1}, 'expireAfterSeconds': self._ttl_seconds()}
+            )
+    
+    def _encode_results(self, results, field="results"):
+        """Return the document fields that store a payload under field"""
+        if self.compression != 'zlib':
+            return {field: results}
+        payload = json.dumps(results, separators=(',', ':'), default=str).encode()
+        return {
+            f"{field}_z": Binary(zlib.compress(payload, self.compression_level)),
+            "encoding": "zlib-json-v1"
+        }
+    
+    def _stale_fields(self, stored, field="results"):
+        """Fields to $unset so a document keeps only the representation just written"""
+        if f"{field}_z" in stored:
+            return {field: ""}
+        return {f"{field}_z": "", "encoding": ""}
+    
+    def _decode_results(self, cache_entry, field="results"):
+        """Read a payload from a document in any supported encoding"""
+        encoding = cache_entry.get("encoding")
+        if encoding is None:
+            return cache_entry[field]
+        if encoding == "zlib-json-v1":
+            return json.loads(zlib.decompress(cache_entry[f"{field}_z"]))
+        raise ValueError(f"Unknown cache encoding: {encoding}")
+    
+    def _post_key(self, platform, post_id):
+        return f"{platform}:{post_id}"
+    
+    def _normalizable(self, results, kwargs):
+        """Whether a payload is a single platform's list of posts that can go to the post store"""
+        items = results.get('results')
+        return (kwargs.get('platform') in VOLATILE_FIELDS
+                and isinstance(items, list)
+                and all(isinstance(item, dict) and 'id' in item for item in items))
+    
+    def _store_posts(self, platform, items):
+        """Upsert each post once; posts whose content is unchanged only get their counters set"""
+        volatile = VOLATILE_FIELDS[platform]
+        now = datetime.utcnow()
+        
+        posts = {}
+        for item in items:
+            content = {k: v for k, v in item.items() if k not in volatile}
+            content_hash = hashlib.md5(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+            counters = {field: item[field] for field in volatile if field in item}
+            posts[self._post_key(platform, item['id'])] = (item['id'], content, content_hash, counters)
+        
+        known_hashes = {
+            doc['_id']: doc.get('content_hash')
+            for doc in self.posts.find({'_id': {'$in': list(posts)}}, {'content_hash': 1})
+        }
+        
+        operations = []
+        for key, (post_id, content, content_hash, counters) in posts.items():
+            update = {"$set": {"counters": counters, "updated_at": now}}
+            if known_hashes.get(key) != content_hash:
+                stored = self._encode_results(content, "data")
+                update["$set"].update({
+                    **stored,
+                    "platform": platform,
+                    "post_id": post_id,
+                    "content_hash": content_hash
+                })
+                update["$unset"] = self._stale_fields(stored, "data")
+            operations.append(UpdateOne({'_id': key}, update, upsert=True))
+        
+        if operations:
+            self.posts.bulk_write(operations, ordered=False)
+    
+    def _load_posts(self, keys):
+        """Fetch stored posts with one $in read, keyed by _id"""
+        return {doc['_id']: doc for doc in self.posts.find({'_id': {'$in': list(keys)}})}
+    
+    def _hydrate_posts(self, platform, post_ids, docs):
+        """Rebuild a result list in order from loaded posts; None if any has gone missing"""
+        keys = [self._post_key(platform, post_id) for post_id in post_ids]
+        if any(key not in docs for key in keys):
+            return None
+        
+        items = []
+        for key in keys:
+            item = self._decode_results(docs[key], "data")
+            item.update(docs[key].get("counters", {}))
+            items.append(item)
+        return items
+    
+    def update_post(self, platform, post_id, **counters):
+        """Update volatile fields of one stored post in place"""
+        collection = self._collection()
+        if collection is None:
+            return
+        try:
+            self.posts.update_one(
+                {'_id': self._post_key(platform, post_id)},
+                {"$set": {**{f"counters.{field}": value for field, value in counters.items()},
+                          "updated_at": datetime.utcnow()}}
+            )
+        except PyMongoError as e:
+            self._mark_unavailable(e)
+    
+    def _mark_unavailable(self, error):
+        print(f"MongoDB unavailable, serving from memory cache only: {str(error)}")
+        self._unavailable_until = time.monotonic() + self.mongo_retry_seconds
+    
+    def _canonical_params(self, kwargs):
+        """Normalize search parameters so equivalent searches share one key"""
+        canonical = {}
+        for key, value in kwargs.items():
+            if key == 'query' and isinstance(value, str):
+                value = ' '.join(value.replace('"', ' ').replace("'", ' ').lower().split())
+            elif key == 'tags':
+                tags = sorted({tag.strip().lower() for tag in (value or []) if tag and tag.strip()})
+                value = tags or None
+            elif isinstance(value, str):
+                value = value.strip().lower()
+            canonical[key] = value
+        return canonical
+    
+    def _result_size(self, kwargs):
+        """Requested result count, if this search can be served from a larger cached one"""
+        # Deeper pages are offset by pagesize, so only first pages are prefixes
+        if kwargs.get('page', 1) != 1:
+            return None
+        for key in SIZE_PARAMS:
+            if kwargs.get(key) is not None:
+                return int(kwargs[key])
+        return None
     
     def _generate_cache_key(self, **kwargs):
         """Generate a unique hash key for the search parameters"""
+        canonical = self._canonical_params(kwargs)
+        # Result count is left out so a smaller request can reuse a larger entry
+        if self._result_size(kwargs) is not None:
+            for key in SIZE_PARAMS:
+                canonical.pop(key, None)
         # Sort kwargs to ensure consistent hash for same parameters
-        sorted_kwargs = json.dumps(kwargs, sort_keys=True)
+        sorted_kwargs = json.dumps(canonical, sort_keys=True)
         return hashlib.md5(sorted_kwargs.encode()).hexdigest()
     
+    def request_key(self, **kwargs):
+        """Key identifying one exact request, result count included"""
+        sorted_kwargs = json.dumps(self._canonical_params(kwargs), sort_keys=True)
+        return hashlib.md5(sorted_kwargs.encode()).hexdigest()
+    
+    def _covers(self, results, stored_size, requested_size):
+        """Whether an entry fetched with stored_size holds everything requested_size would return"""
+        if requested_size is None or stored_size is None or requested_size <= stored_size:
+            return True
+        # A platform that returned fewer items than asked for has nothing more to give
+        return all(len(items) < stored_size for items in self._result_lists(results))
+    
+    def _result_lists(self, results):
+        if isinstance(results.get('results'), list):
+            yield results['results']
+        for value in results.values():
+            if isinstance(value, dict) and isinstance(value.get('results'), list):
+                yield value['results']
+    
+    def _slice_results(self, results, size):
+        """Trim every result list in a payload to the first size items"""
+        if size is None:
+            return results
+        
+        sliced = dict(results)
+        if isinstance(results.get('results'), list) and len(results['results']) > size:
+            sliced['results'] = results['results'][:size]
+            sliced['total_results'] = size
+            if 'has_more' in results:
+                sliced['has_more'] = True
+        for key, value in results.items():
+            if isinstance(value, dict) and isinstance(value.get('results'), list):
+                sliced[key] = self._slice_results(value, size)
+        return sliced
+    
     def get_cached_results(self, **kwargs):
         """Retrieve cached results if they exist and are not expired"""
+        results, is_stale = self.get_cached_entry(**kwargs)
+        if is_stale:
+            return None
+        return results
+    
+    def get_cached_entry(self, **kwargs):
+        """Return (results, is_stale) for entries that have not passed the stale limit"""
+        return self.get_cached_entries([kwargs])[0]
+    
+    def get_cached_entries(self, params_list):
+        """get_cached_entry for many searches at once: one read for the entries, one for their posts"""
+        lookups = [(self._generate_cache_key(**kwargs), self._result_size(kwargs)) for kwargs in params_list]
+        found = [(None, False)] * len(lookups)
+        
+        missing = {}
+        for position, (query_hash, requested_size) in enumerate(lookups):
+            entry = self.memory.get(query_hash)
+            if entry is not None and self._covers(entry['results'], entry['size'], requested_size):
+                found[position] = (self._slice_results(entry['results'], requested_size), False)
+            else:
+                missing.setdefault(query_hash, []).append(position)
+        
+        if not missing:
+            return found
+        
+        collection = self._collection()
+        if collection is None:
+            return found
+        
+        now = datetime.utcnow()
+        try:
+            cache_entries = list(collection.find({
+                "query_hash": {"$in": list(missing)},
+                "timestamp": {"$gt": now - max(self.cache_expiration, self.stale_expiration)}
+            }))
+            post_keys = {
+                self._post_key(cache_entry["post_platform"], post_id)
+                for cache_entry in cache_entries if "post_ids" in cache_entry
+                for post_id in cache_entry["post_ids"]
+            }
+            posts = self._load_posts(post_keys) if post_keys else {}
+        except PyMongoError as e:
+            self._mark_unavailable(e)
+            return found
+        
+        for cache_entry in cache_entries:
+            for position in missing.get(cache_entry["query_hash"], []):
+                found[position] = self._entry_results(cache_entry, lookups[position][1], posts, now)
+        return found
+    
+    def _entry_results(self, cache_entry, requested_size, posts, now):
+        """(results, is_stale) for one stored document, promoting fresh entries to memory"""
+        try:
+            results = self._decode_results(cache_entry)
+            if "post_ids" in cache_entry:
+                items = self._hydrate_posts(cache_entry["post_platform"], cache_entry["post_ids"], posts)
+                if items is None:
+                    return None, False
+                results = {**results, 'results': items}
+        except (ValueError, zlib.error) as e:
+            print(f"Error decoding cache entry: {str(e)}")
+            return None, False
+        
+        stored_size = cache_entry.get("size")
+        if not self._covers(results, stored_size, requested_size):
+            return None, False
+        
+        remaining = self.cache_expiration - (now - cache_entry["timestamp"])
+        if remaining.total_seconds() <= 0:
+            return self._slice_results(results, requested_size), True
+        
+        self.memory.set(cache_entry["query_hash"], {'results': results, 'size': stored_size}, remaining.total_seconds())
+        return self._slice_results(results, requested_size), False
+    
+    def get_refresh_base(self, **kwargs):
+        """Untrimmed stored entry {'results', 'size', 'since', 'loaded_at'} to refresh from, or None"""
+        collection = self._collection()
+        if collection is None:
+            return None
+        
+        try:
+            cache_entry = collection.find_one({"query_hash": self._generate_cache_key(**kwargs)})
+            if cache_entry is None:
+                return None
+            post_keys = [
+                self._post_key(cache_entry["post_platform"], post_id)
+                for post_id in cache_entry.get("post_ids", [])
+            ]
+            posts = self._load_posts(post_keys) if post_keys else {}
+        except PyMongoError as e:
+            self._mark_unavailable(e)
+            return None
+        
+        now = datetime.utcnow()
+        results, _ = self._entry_results(cache_entry, None, posts, now)
+        if results is None:
+            return None
+        
+        # Incremental refreshes only add and re-rank; membership they can't see
+        # (posts that rose into the results) is corrected by a full load once the
+        # entry has gone this long without one, signalled by since=None
+        loaded_at = cache_entry.get("loaded_at")
+        full_load_due = loaded_at is None or now - loaded_at >= max(self.cache_expiration, self.stale_expiration)
+        return {
+            'results': results,
+            'size': cache_entry.get("size"),
+            'since': None if full_load_due else cache_entry["timestamp"],
+            'loaded_at': None if full_load_due else loaded_at
+        }
+    
+    def sized_params(self, kwargs, size):
+        """Copy of search parameters asking for size results"""
+        if size is None:
+            return dict(kwargs)
+        return {key: size if key in SIZE_PARAMS and value is not None else value for key, value in kwargs.items()}
+    
+    def schedule_refresh(self, refresh, **kwargs):
+        """Run refresh() in the background once per cache key; returns False if skipped"""
         query_hash = self._generate_cache_key(**kwargs)
-        cache_entry = self.cache.find_one({
-            "query_hash": query_hash,
-            "timestamp": {"$gt": datetime.utcnow() - self.cache_expiration}
-        })
         
-        if cache_entry:
-            return cache_entry["results"]
-        return None
+        with self._refresh_lock:
+            if query_hash in self._refreshing or len(self._refreshing) >= self.max_pending_refreshes:
+                return False
+            self._refreshing.add(query_hash)
+        
+        def run():
+            try:
+                refresh()
+            except Exception as e:
+                print(f"Error refreshing cache entry: {str(e)}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(query_hash)
+        
+        self._refresh_executor.submit(run)
+        return True
     
-    def cache_results(self, results, **kwargs):
+    def cache_results(self, results, loaded_at=None, **kwargs):
         """Store results in cache with the current timestamp"""
+        # loaded_at is when membership was last fetched in full; incremental refreshes carry it over
         query_hash = self._generate_cache_key(**kwargs)
+        size = self._result_size(kwargs)
+        self.memory.set(query_hash, {'results': results, 'size': size})
+        
+        collection = self._collection()
+        if collection is None:
+            return
         
-        self.cache.update_one(
-            {"query_hash": query_hash},
-            {
-                "$set": {
-                    "results": results,
-                    "timestamp": datetime.utcnow(),
-                    "parameters": kwargs
+        now = datetime.utcnow()
+        try:
+            # Platform result lists go to the post store; the entry keeps only the
+            # ordered ids plus the response metadata
+            if self._normalizable(results, kwargs):
+                platform = kwargs['platform']
+                self._store_posts(platform, results['results'])
+                stored = self._encode_results({k: v for k, v in results.items() if k != 'results'})
+                entry_fields = {
+                    "post_platform": platform,
+                    "post_ids": [item['id'] for item in results['results']]
                 }
-            },
-            upsert=True
-        )
+                unset_fields = self._stale_fields(stored)
+            else:
+                stored = self._encode_results(results)
+                entry_fields = {}
+                unset_fields = {**self._stale_fields(stored), "post_platform": "", "post_ids": ""}
+            
+            collection.update_one(
+                {"query_hash": query_hash},
+                {
+                    "$set": {
+                        **stored,
+                        **entry_fields,
+                        "timestamp": now,
+                        "loaded_at": loaded_at or now,
+                        "size": size,
+                        "parameters": kwargs
+                    },
+                    # Drop whichever representation this write does not use
+                    "$unset": unset_fields
+                },
+                upsert=True
+            )
+        except PyMongoError as e:
+            self._mark_unavailable(e)
     
     def clear_expired_cache(self):
-        """Remove expired cache entries"""
-        self.cache.delete_many({
-            "timestamp": {"$lt": datetime.utcnow() - self.cache_expiration}
-        })
+        """Remove expired cache entries (the TTL index normally does this on its own)"""
+        collection = self._collection()
+        if collection is None:
+            return
+        
+        try:
+            collection.delete_many({
+                "timestamp": {"$lt": datetime.utcnow() - max(self.cache_expiration, self.stale_expiration)}
+            })
+        except PyMongoError as e:
+            self._mark_unavailable(e)
     
     def clear_cache(self):
         """Clear all cached results"""
-        self.cache.delete_many({})
+        self.memory.clear()
+        
+        collection = self._collection()
+        if collection is None:
+            raise RuntimeError('MongoDB is unavailable; only the memory cache was cleared')
+        
+        try:
+            collection.delete_many({})
+            self.posts.delete_many({})
+        except PyMongoError as e:
+            self._mark_unavailable(e)
+            raise
 
     def set_cache_expiration(self, hours=24):
         """Set cache expiration time"""
-        self.cache_expiration = timedelta(hours=hours)
\ No newline at end of file
+        self.cache_expiration = timedelta(hours=hours)
+        self.memory.ttl_seconds = min(self.memory_ttl_seconds, self.cache_expiration.total_seconds())
+        self.memory.clear()
+        
+        if self.indexes_ready:
+            try:
+                self._apply_ttl_index(self.cache, "timestamp")
+                self._apply_ttl_index(self.posts, "updated_at")
+            except PyMongoError as e:
+                self._mark_unavailable(e)
+
+    def stats(self):
+        """Return in-process cache counters and Mongo connection state"""
+        with self._refresh_lock:
+            pending_refreshes = len(self._refreshing)
+        if self.cache is None and self._unavailable_until == 0:
+            mongo_state = 'not_connected'
+        elif time.monotonic() < self._unavailable_until:
+            mongo_state = 'unavailable'
+        else:
+            mongo_state = 'connected'
+        return {
+            'memory': self.memory.stats(),
+            'pending_refreshes': pending_refreshes,
+            'mongo': {'state': mongo_state, 'indexes_ready': self.indexes_ready}
+        }
\ No newline at end of file
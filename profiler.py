@@ -0,0 +1,224 @@
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+import cProfile
+import hmac
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import dotenv
+
+dotenv.load_dotenv()
+
+# Profile of the request being handled, set only while that request is profiled
+_active_profile: ContextVar[Optional['ProfileSession']] = ContextVar('active_profile', default=None)
+
+
+def _start_profile() -> Optional[cProfile.Profile]:
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Python 3.12+ allows a single active profiler per process
+        return None
+    return profile
+
+
+class ProfileSession:
+    """cProfile of one request plus the executor tasks it spawned"""
+
+    def __init__(self, route: str, path: str, reason: str):
+        self.route = route
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._children: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._profile = _start_profile()
+        self._token = _active_profile.set(self) if self._profile is not None else None
+
+    @property
+    def active(self) -> bool:
+        return self._profile is not None
+
+    def run_child(self, fn: Callable, *args, **kwargs):
+        """Run fn on a worker thread under its own profile, merged into this session at finish"""
+        profile = _start_profile()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+                with self._lock:
+                    self._children.append(profile)
+
+    def finish(self) -> Dict:
+        """Stop profiling and return the merged pstats data"""
+        self._profile.disable()
+        _active_profile.reset(self._token)
+        stats = pstats.Stats(self._profile)
+        # Tasks still running past the request (e.g. timed out) are left out
+        with self._lock:
+            children = list(self._children)
+        for child in children:
+            stats.add(child)
+        return {
+            'route': self.route,
+            'path': self.path,
+            'reason': self.reason,
+            'started_at': self.started_at,
+            'duration_ms': round((time.perf_counter() - self._started) * 1000, 2),
+            'tasks': len(children),
+            'stats': stats.stats
+        }
+
+
+def bind_profile(fn: Callable) -> Callable:
+    """Wrap fn so that, when the current request is profiled, running it elsewhere is profiled too"""
+    session = _active_profile.get()
+    if session is None:
+        return fn
+
+    def run(*args, **kwargs):
+        return session.run_child(fn, *args, **kwargs)
+
+    return run
+
+
+def collapsed_stacks(stats: Dict, max_depth: int = 64) -> str:
+    """Approximate collapsed-stack text (one "a;b;c microseconds" line per stack) from pstats data
+
+    cProfile keeps caller/callee edges rather than whole stacks, so each
+    function's time is split between its callees in proportion to the edge
+    timings, the same approximation pstats-based flame graph tools make.
+    """
+    callees: Dict = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func) -> str:
+        filename, line, name = func
+        if filename == '~':
+            return name
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    lines: Dict[str, float] = {}
+
+    def walk(func, stack, budget):
+        cumulative = stats[func][3]
+        if cumulative <= 0 or budget <= 0:
+            return
+        share = budget / cumulative
+        frames = stack + [label(func)]
+        key = ';'.join(frames)
+        lines[key] = lines.get(key, 0.0) + stats[func][2] * share
+        if len(frames) >= max_depth:
+            return
+        for callee, edge_cumulative in callees.get(func, []):
+            # Recursion is folded into the outermost frame
+            if label(callee) in frames or callee not in stats:
+                continue
+            walk(callee, frames, edge_cumulative * share)
+
+    roots = [func for func, row in stats.items() if not any(caller in stats for caller in row[4])]
+    for root in roots:
+        walk(root, [], stats[root][3])
+
+    return ''.join(
+        f"{stack} {int(seconds * 1e6)}\n"
+        for stack, seconds in sorted(lines.items()) if seconds * 1e6 >= 1
+    )
+
+
+class RequestProfiler:
+    """Opt-in cProfile of requests that carry the profile token, or of a random sample"""
+
+    def __init__(self,
+                 token: Optional[str] = os.getenv('PROFILE_TOKEN'),
+                 sample_rate: float = float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+                 max_profiles: int = int(os.getenv('PROFILE_BUFFER_SIZE', 20))):
+        self.token = token or None
+        self.sample_rate = sample_rate if self.token else 0.0
+        self._profiles = deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.token is not None
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and token is not None and hmac.compare_digest(token, self.token)
+
+    def start(self, route: str, path: str, token: Optional[str]) -> Optional[ProfileSession]:
+        """Profile session for this request, or None when it is not to be profiled"""
+        if self.authorized(token):
+            reason = 'requested'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            reason = 'sampled'
+        else:
+            return None
+
+        session = ProfileSession(route, path, reason)
+        return session if session.active else None
+
+    def finish(self, session: ProfileSession) -> int:
+        """Store the finished session in the ring buffer and return its id"""
+        profile = session.finish()
+        with self._lock:
+            profile['id'] = next(self._ids)
+            self._profiles.append(profile)
+        return profile['id']
+
+    def summaries(self) -> List[Dict]:
+        """Stored profiles without their stats, newest first"""
+        with self._lock:
+            profiles = list(self._profiles)
+        return [{key: value for key, value in profile.items() if key != 'stats'} for profile in reversed(profiles)]
+
+    def get(self, profile_id: int) -> Optional[Dict]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile['id'] == profile_id), None)
+
+    def export(self, profile: Dict, fmt: str) -> bytes:
+        """pstats (loadable with pstats.Stats or snakeviz), collapsed stacks, or a text report"""
+        if fmt == 'pstats':
+            return marshal.dumps(profile['stats'])
+        if fmt == 'collapsed':
+            return collapsed_stacks(profile['stats']).encode()
+        if fmt == 'text':
+            output = io.StringIO()
+            stats = pstats.Stats(_StatsSource(profile['stats']), stream=output)
+            stats.sort_stats('cumulative').print_stats(50)
+            return output.getvalue().encode()
+        raise ValueError(f"Unknown profile format: {fmt}")
+
+
+class _StatsSource:
+    """Lets pstats.Stats load an in-memory stats dict through its create_stats protocol"""
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+_default_profiler = None
+_default_profiler_lock = threading.Lock()
+
+
+def get_default_profiler() -> RequestProfiler:
+    """Return the process-wide RequestProfiler, creating it on first use"""
+    global _default_profiler
+    with _default_profiler_lock:
+        if _default_profiler is None:
+            _default_profiler = RequestProfiler()
+        return _default_profiler
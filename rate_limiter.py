@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import asyncio
+import re
+import threading
+import time
+import os
+import dotenv
+dotenv.load_dotenv()
+
+
+THROTTLE_WAIT = re.compile(r'available in (\d+) seconds?')
+
+
+class RateLimitedError(Exception):
+    """Raised when a StackExchange call cannot be made within the rate or quota budget"""
+
+
+class QuotaRateLimiter:
+    """Token bucket shared by every StackExchange call, aware of quota and backoff"""
+
+    def __init__(self,
+                 rate: float = float(os.getenv('STACKEXCHANGE_RATE_PER_SECOND', 10)),
+                 burst: int = int(os.getenv('STACKEXCHANGE_BURST', 20)),
+                 low_quota_threshold: int = int(os.getenv('STACKEXCHANGE_LOW_QUOTA', 500)),
+                 max_wait: float = float(os.getenv('STACKEXCHANGE_MAX_WAIT_SECONDS', 5)),
+                 throttle_backoff: float = float(os.getenv('STACKEXCHANGE_THROTTLE_BACKOFF_SECONDS', 30))):
+
+        self.rate = rate
+        self.burst = burst
+        self.low_quota_threshold = low_quota_threshold
+        self.max_wait = max_wait
+        self.throttle_backoff = throttle_backoff
+
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._backoff_until = 0.0
+        self._lock = threading.Lock()
+
+        self.quota_remaining: Optional[int] = None
+        self.quota_max: Optional[int] = None
+        self.throttled = 0
+
+    def _reserve(self) -> float:
+        """Take a token if one is available now, else return seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._backoff_until:
+                return self._backoff_until - now
+
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Block until a call may be made; False if that would take longer than timeout"""
+        deadline = time.monotonic() + (self.max_wait if timeout is None else timeout)
+        while True:
+            wait = self._reserve()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                with self._lock:
+                    self.throttled += 1
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """acquire() for coroutines; sleeps on the event loop instead of the thread"""
+        deadline = time.monotonic() + (self.max_wait if timeout is None else timeout)
+        while True:
+            wait = self._reserve()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                with self._lock:
+                    self.throttled += 1
+                return False
+            await asyncio.sleep(wait)
+
+    def update(self, data: Optional[Dict]):
+        """Record quota_remaining, quota_max and backoff from a StackExchange response body"""
+        if not data:
+            return
+        with self._lock:
+            if data.get('quota_remaining') is not None:
+                self.quota_remaining = data['quota_remaining']
+            if data.get('quota_max') is not None:
+                self.quota_max = data['quota_max']
+            if data.get('backoff'):
+                self._backoff_until = max(self._backoff_until, time.monotonic() + data['backoff'])
+            if self.quota_remaining == 0:
+                self._pause_until_quota_reset()
+
+    def record_throttled(self, retry_after: Optional[float] = None, error_message: Optional[str] = None):
+        """Back off after a 429 or throttle_violation for as long as StackExchange asks, else briefly"""
+        if not retry_after and error_message:
+            # e.g. "too many requests from this IP, more requests available in 74 seconds"
+            match = THROTTLE_WAIT.search(error_message)
+            retry_after = float(match.group(1)) if match else None
+        with self._lock:
+            self._backoff_until = max(self._backoff_until, time.monotonic() + (retry_after or self.throttle_backoff))
+
+    def _pause_until_quota_reset(self):
+        # StackExchange quotas reset at midnight UTC
+        now = datetime.utcnow()
+        reset = datetime(now.year, now.month, now.day) + timedelta(days=1)
+        self._backoff_until = max(self._backoff_until, time.monotonic() + (reset - now).total_seconds())
+
+    def quota_low(self) -> bool:
+        """True once the daily quota is close enough to zero to skip optional calls"""
+        return self.quota_remaining is not None and self.quota_remaining <= self.low_quota_threshold
+
+    def budget(self) -> Dict:
+        """Current quota, backoff and bucket state"""
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            return {
+                'quota_remaining': self.quota_remaining,
+                'quota_max': self.quota_max,
+                'quota_low': self.quota_remaining is not None and self.quota_remaining <= self.low_quota_threshold,
+                'backoff_seconds': round(max(0.0, self._backoff_until - now), 3),
+                'tokens': round(tokens, 3),
+                'rate_per_second': self.rate,
+                'burst': self.burst,
+                'throttled': self.throttled
+            }
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_limiter() -> QuotaRateLimiter:
+    """Return the process-wide StackExchange limiter, creating it on first use"""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = QuotaRateLimiter()
+        return _default_limiter
@@ -1,13 +1,33 @@
-import requests
+import aiohttp
+import asyncio
 import json
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Dict, Iterator, List, Optional, Tuple
 import os
+import time
+from async_engine import AsyncSearchEngine, get_default_engine
+from metrics import Metrics, get_default_metrics
+
+# Sorts whose order can be rebuilt from the fields a cached post holds
+INCREMENTAL_SORTS = ('new', 'top', 'comments')
+
+# Spans of Reddit's t= filter; 'all' has none
+TIME_WINDOWS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+    'year': timedelta(days=365)
+}
 
 class RedditSearcher:
-    def __init__(self):
+    def __init__(self,
+                 engine: Optional[AsyncSearchEngine] = None,
+                 metrics: Optional[Metrics] = None):
         
-        self.base_url = "https://www.reddit.com"
+        self.engine = engine or get_default_engine()
+        self.metrics = metrics or get_default_metrics()
+        self.base_url = os.getenv('REDDIT_BASE_URL', "https://www.reddit.com")
         self.headers = {
             'User-Agent': 'Python/RequestsScript 1.0'
         }
@@ -19,6 +39,231 @@ class RedditSearcher:
                time_filter: str = "all",
                limit: int = 25) -> Dict:
       
+        # Blocking callers run the same coroutine on the engine loop
+        return self._run(self.search_async(query, subreddit, sort, time_filter, limit), query)
+
+    async def search_async(self,
+                           query: str,
+                           subreddit: Optional[str] = None,
+                           sort: str = "relevance",
+                           time_filter: str = "all",
+                           limit: int = 25) -> Dict:
+        
+        search_url, params = self._build_request(query, subreddit, sort, time_filter, limit)
+        
+        try:
+            with self.metrics.stage('search_request', 'reddit'):
+                data = await self._get_json(search_url, params)
+            
+            return self._build_response(query, subreddit, data)
+        
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error making request: {e}")
+            return self._error_response(query, str(e) or type(e).__name__)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing JSON response: {e}")
+            return self._error_response(query, 'Invalid JSON response')
+
+    def iter_pages(self,
+                   query: str,
+                   subreddit: Optional[str] = None,
+                   sort: str = "relevance",
+                   time_filter: str = "all",
+                   page_size: int = 100,
+                   max_results: Optional[int] = None,
+                   after: Optional[str] = None,
+                   before: Optional[str] = None,
+                   prefetch: bool = True) -> Iterator[Dict]:
+        
+        # Follows Reddit's listing cursors lazily and yields one processed page at a
+        # time, each carrying the 'after'/'before' cursors to resume from. Starting
+        # from `before` walks backwards. With prefetch the next page is requested on
+        # the engine loop while the caller works through the current one. A failed
+        # request is yielded as a final error page that keeps the cursor it failed on.
+        search_url, params = self._build_request(query, subreddit, sort, time_filter, page_size)
+        backwards = before is not None and after is None
+        cursor_param = 'before' if backwards else 'after'
+        cursor = before if backwards else after
+        
+        async def fetch(cursor: Optional[str], count: int) -> Dict:
+            page_params = {**params, 'count': count}
+            if max_results is not None:
+                page_params['limit'] = min(page_params['limit'], max_results - count)
+            if cursor:
+                page_params[cursor_param] = cursor
+            return (await self._get_json(search_url, page_params))['data']
+        
+        prefetched = []
+        
+        def schedule(cursor: Optional[str], count: int):
+            if not prefetch:
+                return lambda: self.engine.run(fetch(cursor, count))
+            future = self.engine.start(fetch(cursor, count))
+            prefetched.append(future)
+            return future.result
+        
+        count = 0
+        pending = schedule(cursor, count)
+        try:
+            while pending is not None:
+                try:
+                    listing = pending()
+                except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError, KeyError) as e:
+                    print(f"Error making request: {e}")
+                    yield {**self._error_response(query, str(e) or type(e).__name__), cursor_param: cursor}
+                    return
+                
+                children = listing['children']
+                count += len(children)
+                cursor = listing.get(cursor_param)
+                has_more = bool(cursor and children)
+                capped = max_results is not None and count >= max_results
+                pending = schedule(cursor, count) if has_more and not capped else None
+                
+                page = self._build_response(query, subreddit, {'data': listing})
+                page['after'] = listing.get('after')
+                page['before'] = listing.get('before')
+                page['has_more'] = has_more
+                yield page
+        finally:
+            # A page still in flight when the caller stops is not needed
+            for future in prefetched:
+                future.cancel()
+
+    def refresh(self,
+                cached: Dict,
+                since: Optional[datetime],
+                query: str,
+                subreddit: Optional[str] = None,
+                sort: str = "relevance",
+                time_filter: str = "all",
+                limit: int = 25,
+                max_pages: int = 3) -> Optional[Tuple[Dict, bool]]:
+        
+        try:
+            return self.engine.run(self.refresh_async(cached, since, query, subreddit, sort, time_filter, limit, max_pages))
+        except asyncio.TimeoutError:
+            print(f"Error refreshing results: no response within {self.engine.default_deadline}s")
+            return None
+
+    async def refresh_async(self,
+                            cached: Dict,
+                            since: Optional[datetime],
+                            query: str,
+                            subreddit: Optional[str] = None,
+                            sort: str = "relevance",
+                            time_filter: str = "all",
+                            limit: int = 25,
+                            max_pages: int = 3) -> Optional[Tuple[Dict, bool]]:
+        
+        # Brings a cached search up to date: walks sort=new only until a post we
+        # already hold (or one older than the cache entry) shows up, then refreshes
+        # counters of the held posts in bulk. Returns (results, reloaded), where
+        # reloaded means membership was fetched in full, or None if a full load is needed.
+        
+        # Relevance and hot rankings are Reddit's own, so new posts can't be placed
+        # among the held ones. A listing carries every post in full, so one search
+        # call costs less than the walk plus the counters call
+        if since is None or sort not in INCREMENTAL_SORTS:
+            return await self.search_async(query, subreddit, sort, time_filter, limit), True
+        
+        since_epoch = since.replace(tzinfo=timezone.utc).timestamp()
+        # Held posts that have aged out of the time filter are dropped, not refreshed
+        window = TIME_WINDOWS.get(time_filter)
+        cutoff = (datetime.now() - window).isoformat() if window else None
+        held_posts = [post for post in cached.get('results', []) if cutoff is None or post['created_at'] >= cutoff]
+        known_ids = {post['id'] for post in held_posts}
+        search_url, params = self._build_request(query, subreddit, 'new', time_filter, 100)
+        
+        try:
+            new_posts = []
+            for _ in range(max_pages):
+                listing = (await self._get_json(search_url, params))['data']
+                
+                fresh = []
+                reached_known = False
+                for child in listing['children']:
+                    post_data = child['data']
+                    if post_data['id'] in known_ids or post_data['created_utc'] <= since_epoch:
+                        reached_known = True
+                        break
+                    fresh.append(child)
+                new_posts.extend(self._process_results(fresh))
+                
+                if reached_known or not listing.get('after'):
+                    break
+                params = {**params, 'after': listing['after']}
+            
+            counters = await self._fetch_counters(list(known_ids))
+        
+        except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError, KeyError) as e:
+            print(f"Error refreshing results: {e}")
+            return None
+        
+        existing_posts = []
+        for post in held_posts:
+            existing_posts.append({**post, **counters.get(post['id'], {})})
+        
+        merged = self._merge_results(existing_posts, new_posts, sort)[:min(limit, 100)]
+        return {
+            **cached,
+            'total_results': len(merged),
+            'results': merged
+        }, False
+
+    async def _fetch_counters(self, post_ids: List[str]) -> Dict[str, Dict]:
+        
+        # /api/info takes up to 100 fullnames per call
+        counters = {}
+        for start in range(0, len(post_ids), 100):
+            batch = post_ids[start:start + 100]
+            data = await self._get_json(
+                f"{self.base_url}/api/info.json",
+                {'id': ','.join(f"t3_{post_id}" for post_id in batch)}
+            )
+            
+            for child in data['data']['children']:
+                post_data = child['data']
+                counters[post_data['id']] = {
+                    'score': post_data['score'],
+                    'upvote_ratio': post_data['upvote_ratio'],
+                    'num_comments': post_data['num_comments']
+                }
+        return counters
+
+    async def _get_json(self, url: str, params: Dict) -> Dict:
+        
+        status, data = await self.engine.get_json(url, headers=self.headers, params=params)
+        if data is None:
+            raise aiohttp.ClientError(f"{status} Error for url: {url}")
+        return data
+
+    def _run(self, coro: Awaitable, query: str) -> Dict:
+        
+        # The engine's deadline covers the whole search; running out of it is
+        # reported like any other failed request
+        try:
+            return self.engine.run(coro)
+        except asyncio.TimeoutError:
+            error_msg = f"No response within {self.engine.default_deadline}s"
+            print(f"Error making request: {error_msg}")
+            return self._error_response(query, error_msg)
+
+    def _merge_results(self, existing_posts: List[Dict], new_posts: List[Dict], sort: str) -> List[Dict]:
+        
+        if sort == 'new':
+            return new_posts + existing_posts
+        if sort == 'top':
+            return sorted(new_posts + existing_posts, key=lambda post: post['score'], reverse=True)
+        return sorted(new_posts + existing_posts, key=lambda post: post['num_comments'], reverse=True)
+
+    def _build_request(self,
+                       query: str,
+                       subreddit: Optional[str],
+                       sort: str,
+                       time_filter: str,
+                       limit: int) -> Tuple[str, Dict]:
+        
         if subreddit:
             search_url = f"{self.base_url}/r/{subreddit}/search.json"
         else:
@@ -32,47 +277,32 @@ class RedditSearcher:
             'restrict_sr': bool(subreddit),  
             'type': 'link'  
         }
+        
+        return search_url, params
 
-        try:
-            
-            response = requests.get(
-                search_url,
-                headers=self.headers,
-                params=params
-            )
-            response.raise_for_status() 
-
-    
-            data = response.json()
-            
-    
-            processed_results = self._process_results(data['data']['children'])
-            
-            return {
-                'query': query,
-                'subreddit': subreddit,
-                'total_results': len(processed_results),
-                'results': processed_results
-            }
+    def _build_response(self, query: str, subreddit: Optional[str], data: Dict) -> Dict:
+        
+        processed_results = self._process_results(data['data']['children'])
+        
+        return {
+            'query': query,
+            'subreddit': subreddit,
+            'total_results': len(processed_results),
+            'results': processed_results
+        }
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error making request: {e}")
-            return {
-                'error': str(e),
-                'query': query,
-                'results': []
-            }
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON response: {e}")
-            return {
-                'error': 'Invalid JSON response',
-                'query': query,
-                'results': []
-            }
+    def _error_response(self, query: str, error_msg: str) -> Dict:
+        
+        return {
+            'error': error_msg,
+            'query': query,
+            'results': []
+        }
 
     def _process_results(self, posts: List[Dict]) -> List[Dict]:
         
         processed_posts = []
+        started = time.perf_counter()
         
         for post in posts:
             post_data = post['data']
@@ -100,6 +330,7 @@ class RedditSearcher:
             
             processed_posts.append(processed_post)
         
+        self.metrics.record_stage('process_results', time.perf_counter() - started, 'reddit')
         return processed_posts
 
 def main():
@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+SORT_FIELDS = ('relevance', 'score', 'date', 'comments')
+DIRECTIONS = ('desc', 'asc')
+
+
+def _comment_count(item: Dict) -> int:
+    return item.get('num_comments', item.get('answer_count', 0)) or 0
+
+
+def _item_tags(item: Dict) -> frozenset:
+    # Reddit posts have no tags; their subreddit plays that role
+    if item.get('source') == 'reddit':
+        return frozenset([item.get('subreddit', '').lower()])
+    return frozenset(tag.lower() for tag in item.get('tags', []))
+
+
+def result_fingerprint(items: List[Dict]) -> int:
+    """Changes whenever an item is added, removed, reordered or gets new sort counters"""
+    return hash(tuple(
+        (item.get('source'), item['id'], item.get('score'), _comment_count(item)) for item in items
+    ))
+
+
+def normalize_date(value: Optional[str]) -> Optional[str]:
+    """ISO date or datetime from a query string, in the format results carry in created_at"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value).isoformat()
+
+
+class ResultIndex:
+    """Combined results of one search with every sort order computed up front"""
+
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        self.tags = [_item_tags(item) for item in items]
+
+        # Descending orders; sorted() is stable, so ties keep relevance order.
+        # Relevance descending is the upstream order itself
+        positions = range(len(items))
+        descending = {
+            'relevance': list(positions),
+            'score': sorted(positions, key=lambda i: items[i].get('score') or 0, reverse=True),
+            'date': sorted(positions, key=lambda i: items[i].get('created_at') or '', reverse=True),
+            'comments': sorted(positions, key=lambda i: _comment_count(items[i]), reverse=True)
+        }
+        self.orders = {}
+        for sort, order in descending.items():
+            self.orders[(sort, 'desc')] = order
+            self.orders[(sort, 'asc')] = order[::-1]
+
+    def _matcher(self,
+                 platforms: Optional[Sequence[str]],
+                 tags: Optional[Sequence[str]],
+                 min_score: Optional[float],
+                 max_score: Optional[float],
+                 since: Optional[str],
+                 until: Optional[str]) -> Optional[Callable[[int], bool]]:
+        """Predicate over item positions, or None when nothing is filtered"""
+        if not any(value is not None for value in (platforms, tags, min_score, max_score, since, until)):
+            return None
+
+        wanted_tags = frozenset(tag.lower() for tag in tags) if tags else None
+
+        def matches(index: int) -> bool:
+            item = self.items[index]
+            if platforms is not None and item.get('source') not in platforms:
+                return False
+            if wanted_tags is not None and not (self.tags[index] & wanted_tags):
+                return False
+            score = item.get('score') or 0
+            if min_score is not None and score < min_score:
+                return False
+            if max_score is not None and score > max_score:
+                return False
+            created_at = item.get('created_at') or ''
+            if since is not None and created_at < since:
+                return False
+            if until is not None and created_at > until:
+                return False
+            return True
+
+        return matches
+
+    def query(self,
+              platforms: Optional[Sequence[str]] = None,
+              tags: Optional[Sequence[str]] = None,
+              min_score: Optional[float] = None,
+              max_score: Optional[float] = None,
+              since: Optional[str] = None,
+              until: Optional[str] = None,
+              sort: str = 'relevance',
+              direction: str = 'desc',
+              offset: int = 0,
+              limit: int = 20,
+              cursor: Optional[int] = None) -> Dict:
+        """One page of matching items; cursor is a position in the sort order and takes precedence over offset"""
+        order = self.orders[(sort, direction)]
+        matches = self._matcher(platforms, tags, min_score, max_score, since, until)
+        start = cursor if cursor is not None else 0
+        skip = 0 if cursor is not None else offset
+
+        if matches is None:
+            # Unfiltered pages are a plain slice of the precomputed order
+            begin = start + skip
+            page = order[begin:begin + limit]
+            end = begin + len(page)
+            return {
+                'total': len(order),
+                'results': [self.items[index] for index in page],
+                'next_cursor': end if end < len(order) else None
+            }
+
+        page = []
+        total = 0
+        last_position = None
+        next_cursor = None
+        for position, index in enumerate(order):
+            if not matches(index):
+                continue
+            total += 1
+            if position < start:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            if len(page) < limit:
+                page.append(index)
+                last_position = position
+            elif next_cursor is None:
+                next_cursor = last_position + 1
+
+        return {
+            'total': total,
+            'results': [self.items[index] for index in page],
+            'next_cursor': next_cursor
+        }
@@ -0,0 +1,76 @@
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn once per key; concurrent callers wait for and share its outcome"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                # Forget the key before waking waiters so a failed call is never
+                # replayed to callers that arrive afterwards
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self) -> int:
+        """Number of keys currently being fetched"""
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines; every caller must await do() on the same event loop"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, make_coro: Callable[[], Awaitable[Any]]) -> Any:
+        """Run make_coro() once per key; concurrent callers await and share its outcome"""
+        task = self._calls.get(key)
+        # A finished task whose callback has not run yet is never replayed to new callers
+        if task is None or task.done():
+            task = asyncio.ensure_future(make_coro())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # A caller that gives up (deadline, disconnect) must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        """Number of keys currently being fetched"""
+        return len(self._calls)
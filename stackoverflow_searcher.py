@@ -1,71 +1,202 @@
-import requests
+import aiohttp
+import asyncio
 import json
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timezone
+from typing import Awaitable, Dict, Iterator, List, Optional, Tuple
 import os
+from async_engine import AsyncSearchEngine, get_default_engine
+from rate_limiter import QuotaRateLimiter, RateLimitedError, get_default_limiter
+from answer_text import AnswerTextExtractor, get_default_extractor
+from metrics import Metrics, get_default_metrics
 from dotenv import load_dotenv
 import urllib.parse
-from bs4 import BeautifulSoup
+import time
 import html
 
+# Sorts whose order can be rebuilt from the fields a cached question holds
+INCREMENTAL_SORT_KEYS = {
+    'votes': lambda question: question['score'],
+    'creation': lambda question: question['created_at'],
+    'activity': lambda question: question['last_activity']
+}
+
 class StackOverflowSearcher:
-    def __init__(self):
+    def __init__(self,
+                 engine: Optional[AsyncSearchEngine] = None,
+                 rate_limiter: Optional[QuotaRateLimiter] = None,
+                 text_extractor: Optional[AnswerTextExtractor] = None,
+                 metrics: Optional[Metrics] = None):
        
         load_dotenv()
+        self.engine = engine or get_default_engine()
+        self.rate_limiter = rate_limiter or get_default_limiter()
+        self.text_extractor = text_extractor or get_default_extractor()
+        self.metrics = metrics or get_default_metrics()
         self.api_key = os.getenv('STACKOVERFLOW_API_KEY')
-        self.base_url = "https://api.stackexchange.com/2.3"
+        self.base_url = os.getenv('STACKEXCHANGE_BASE_URL', "https://api.stackexchange.com/2.3")
         self.headers = {
             'User-Agent': 'Python/StackOverflowSearch 1.0'
         }
+        # Batched answer lookups: ids per call (API max is 100)
+        self.ids_per_request = 100
 
     def get_top_answer(self, question_id: int) -> Optional[Dict]:
         
+        # None both when the question has no answers and when the lookup failed
+        return self.get_answer(question_id)['top_answer']
+
+    def get_answer(self, question_id: int) -> Dict:
+        
+        # Top answer for a single question, for views that load it on demand. Unlike
+        # get_top_answer, a failed lookup comes back as an error response so it is
+        # never mistaken for (and cached as) a question without answers.
+        try:
+            return self.engine.run(self.get_answer_async(question_id))
+        except asyncio.TimeoutError:
+            error_msg = f"Error fetching answer: no response within {self.engine.default_deadline}s"
+            print(error_msg)
+            return {'error': error_msg, 'question_id': question_id, 'top_answer': None}
+
+    async def get_answer_async(self, question_id: int) -> Dict:
+        
         answers_url = f"{self.base_url}/questions/{question_id}/answers"
+        params = {**self._answers_params(1), 'pagesize': 1}
         
-        params = {
+        try:
+            data = await self._api_get(answers_url, params)
+        except RateLimitedError as e:
+            return {'error': str(e), 'question_id': question_id, 'top_answer': None}
+        except Exception as e:
+            error_msg = f"Error fetching answer: {str(e)}"
+            print(error_msg)
+            return {'error': error_msg, 'question_id': question_id, 'top_answer': None}
+        
+        items = data.get('items', [])
+        return {
+            'question_id': question_id,
+            'top_answer': self._format_answer(items[0]) if items else None,
+            'quota_remaining': data.get('quota_remaining')
+        }
+
+    async def get_top_answers(self, question_ids: List[int]) -> Dict[int, Optional[Dict]]:
+        
+        # The API accepts up to 100 semicolon-separated ids per call, so a whole
+        # result page resolves in one request instead of one per question
+        top_answers = {question_id: None for question_id in question_ids}
+        
+        async def resolve_batch(batch: List[int]):
+            pending = set(batch)
+            
+            while pending:
+                try:
+                    data = await self._api_get(self._answers_url(batch, pending), self._answers_params(1))
+                except (aiohttp.ClientError, asyncio.TimeoutError, RateLimitedError) as e:
+                    print(f"Error fetching answers: {str(e)}")
+                    return
+                
+                # A page that resolves nothing (answers filed under another
+                # question_id, e.g. after a merge) would be requested again as is
+                resolved = self._collect_top_answers(data, pending, top_answers)
+                if not data.get('has_more') or not resolved:
+                    return
+        
+        await asyncio.gather(*(
+            resolve_batch(question_ids[start:start + self.ids_per_request])
+            for start in range(0, len(question_ids), self.ids_per_request)
+        ))
+        
+        return top_answers
+
+    async def _api_get(self, url: str, params: Dict) -> Dict:
+        
+        # Every StackExchange call goes through the shared limiter so quota and
+        # backoff seen by one request apply to all of them
+        if not await self.rate_limiter.acquire_async():
+            raise RateLimitedError('StackExchange rate limit reached. Please try again later.')
+        
+        status, data, headers = await self.engine.fetch_json(url, headers=self.headers, params=params)
+        
+        if self._is_throttled(status, data or {}):
+            self.rate_limiter.record_throttled(self._retry_after(headers), (data or {}).get('error_message'))
+            raise RateLimitedError('API quota exceeded. Please try again later.')
+        if status >= 400 or data is None:
+            error_msg = f"HTTP {status} for url: {url}"
+            if data and 'error_message' in data:
+                error_msg += f"\nAPI Error: {data['error_message']}"
+            raise aiohttp.ClientError(error_msg)
+        
+        self.rate_limiter.update(data)
+        return data
+
+    def _is_throttled(self, status: int, data: Dict) -> bool:
+        
+        # StackExchange reports throttling as a 429, or as a 400 with error_id 502
+        return status == 429 or (status == 400 and data.get('error_id') == 502)
+
+    def _retry_after(self, headers) -> Optional[float]:
+        
+        try:
+            return float(headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    def _answer_lookup_ids(self, questions: List[Dict]) -> List[int]:
+        
+        # Answers are optional; skip them entirely while the daily quota is low
+        if self.rate_limiter.quota_low():
+            return []
+        return [q['question_id'] for q in questions if q.get('answer_count', 0) > 0]
+
+    def _answers_url(self, batch: List[int], pending: set) -> str:
+        
+        # Only questions still without a top answer are asked for again, so each
+        # call returns answers that are still needed
+        ids = ';'.join(str(question_id) for question_id in batch if question_id in pending)
+        return f"{self.base_url}/questions/{ids}/answers"
+
+    def _answers_params(self, page: int) -> Dict:
+        
+        return {
             'site': 'stackoverflow',
             'order': 'desc',
             'sort': 'votes',
-            'filter': 'withbody', 
-            'pagesize': 1,  
+            'filter': 'withbody',
+            'page': page,
+            'pagesize': 100,
             'key': self.api_key
         }
+
+    def _collect_top_answers(self, data: Dict, pending: set, top_answers: Dict[int, Optional[Dict]]) -> int:
         
-        try:
-            response = requests.get(
-                answers_url,
-                headers=self.headers,
-                params=params
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if data['items']:
-                answer = data['items'][0]
-                return {
-                    'score': answer['score'],
-                    'is_accepted': answer.get('is_accepted', False),
-                    'body': answer['body'],
-                    'link': f"https://stackoverflow.com/a/{answer['answer_id']}"
-                }
-            return None
-            
-        except Exception as e:
-            print(f"Error fetching answer: {str(e)}")
-            return None
+        # Items are sorted by votes across the whole batch, so the first
+        # answer seen for a question is its top answer. Returns how many
+        # pending questions this page resolved.
+        resolved = 0
+        for answer in data.get('items', []):
+            question_id = answer['question_id']
+            if question_id in pending:
+                top_answers[question_id] = self._format_answer(answer)
+                pending.discard(question_id)
+                resolved += 1
+        return resolved
 
-    def _clean_html(self, html_content: str) -> str:
+    def _format_answer(self, answer: Dict) -> Dict:
         
-        soup = BeautifulSoup(html_content, 'html.parser')
-       
-        code_blocks = []
-        for code in soup.find_all('code'):
-            code_blocks.append(f"Code: {code.get_text()}")
-            code.decompose()
-    
-        text = soup.get_text(separator=' ').strip()
-    
-        text = ' '.join(text.split())
+        # Snippet and code blocks are extracted once here, so they are stored
+        # with the cached result instead of being parsed again on every display
+        return {
+            'score': answer['score'],
+            'is_accepted': answer.get('is_accepted', False),
+            'body': answer['body'],
+            **self.text_extractor.summarize(answer['body'], answer['answer_id']),
+            'link': f"https://stackoverflow.com/a/{answer['answer_id']}"
+        }
+
+    def _clean_html(self, html_content: str, answer_id: Optional[int] = None) -> str:
+        
+        extracted = self.text_extractor.extract(html_content, answer_id)
+        text = extracted['text']
+        code_blocks = [f"Code: {code}" for code in extracted['code_blocks']]
       
         if code_blocks:
             text += '\n\nCode Examples:\n' + '\n'.join(code_blocks[:2]) 
@@ -78,8 +209,274 @@ class StackOverflowSearcher:
                sort: str = "relevance",
                order: str = "desc",
                page: int = 1,
-               pagesize: int = 30) -> Dict:
+               pagesize: int = 30,
+               include_answers: bool = True) -> Dict:
        
+        # Blocking callers run the same coroutine on the engine loop
+        return self._run(self.search_async(query, tags, sort, order, page, pagesize, include_answers), query)
+
+    def iter_search(self,
+                    query: str,
+                    tags: Optional[List[str]] = None,
+                    sort: str = "relevance",
+                    order: str = "desc",
+                    page: int = 1,
+                    pagesize: int = 30,
+                    first_batch: int = 5) -> Iterator[Tuple[str, Dict]]:
+        
+        # Yields ('question', question) as each answer batch resolves and finally
+        # ('response', ...) with the same shape search() returns. The first batch
+        # is kept small so the earliest questions are not held up by the rest.
+        data = self._run(self._search_questions(query, tags, sort, order, page, pagesize), query)
+        if 'error' in data:
+            yield 'response', data
+            return
+        
+        questions = data['items']
+        processed_results = []
+        
+        try:
+            for batch in (questions[:first_batch], questions[first_batch:]):
+                if not batch:
+                    continue
+                top_answers = self.engine.run(self._fetch_top_answers(batch))
+                for processed_question in self._process_results(batch, top_answers):
+                    processed_results.append(processed_question)
+                    yield 'question', processed_question
+        except Exception as e:
+            yield 'response', self._error_response(query, f"Unexpected error: {str(e)}")
+            return
+        
+        yield 'response', self._build_response(query, tags, data, processed_results)
+
+    async def search_async(self,
+                           query: str,
+                           tags: Optional[List[str]] = None,
+                           sort: str = "relevance",
+                           order: str = "desc",
+                           page: int = 1,
+                           pagesize: int = 30,
+                           include_answers: bool = True) -> Dict:
+        
+        # include_answers=False skips the answer lookups for summary listings;
+        # get_answer() fetches a single answer when it is actually opened
+        data = await self._search_questions(query, tags, sort, order, page, pagesize)
+        if 'error' in data:
+            return data
+        
+        try:
+            top_answers = await self._fetch_top_answers(data['items']) if include_answers else {}
+            processed_results = self._process_results(data['items'], top_answers)
+        except Exception as e:
+            error_msg = f"Unexpected error: {str(e)}"
+            print(error_msg)
+            return self._error_response(query, error_msg)
+        
+        return self._build_response(query, tags, data, processed_results)
+
+    def refresh(self,
+                cached: Dict,
+                since: Optional[datetime],
+                query: str,
+                tags: Optional[List[str]] = None,
+                sort: str = "relevance",
+                order: str = "desc",
+                pagesize: int = 30) -> Optional[Tuple[Dict, bool]]:
+        
+        try:
+            return self.engine.run(self.refresh_async(cached, since, query, tags, sort, order, pagesize))
+        except asyncio.TimeoutError:
+            print(f"Error refreshing results: no response within {self.engine.default_deadline}s")
+            return None
+
+    async def refresh_async(self,
+                            cached: Dict,
+                            since: Optional[datetime],
+                            query: str,
+                            tags: Optional[List[str]] = None,
+                            sort: str = "relevance",
+                            order: str = "desc",
+                            pagesize: int = 30) -> Optional[Tuple[Dict, bool]]:
+        
+        # Brings a cached first page up to date: searches only questions created
+        # since the entry was stored, refreshes counters of the held questions in
+        # bulk and re-fetches top answers only where there has been activity.
+        # Returns (results, reloaded), where reloaded means membership was
+        # fetched in full, or None if a full load is needed.
+        if since is None:
+            return await self.search_async(query, tags, sort, order, 1, pagesize), True
+        
+        since_epoch = int(since.replace(tzinfo=timezone.utc).timestamp())
+        if sort not in INCREMENTAL_SORT_KEYS:
+            return await self._rerank(cached, since_epoch, query, tags, sort, order, pagesize), True
+        
+        cached_questions = cached.get('results', [])
+        known_ids = [question['id'] for question in cached_questions]
+        
+        search_url, params = self._search_request(query, tags, sort, order, 1, pagesize)
+        if sort == 'activity':
+            # Older questions with new activity also move up; min bounds the sort field
+            params['min'] = since_epoch
+        else:
+            params['fromdate'] = since_epoch
+        
+        try:
+            data = await self._api_get(search_url, params)
+            held = set(known_ids)
+            new_questions = [q for q in data['items'] if q['question_id'] not in held]
+            
+            counters = await self._fetch_question_counters(known_ids)
+            active_ids = [
+                question_id for question_id, question in counters.items()
+                if question['last_activity_date'] > since_epoch and question.get('answer_count', 0) > 0
+            ]
+            
+            answer_ids = self._answer_lookup_ids(new_questions)
+            if not self.rate_limiter.quota_low():
+                answer_ids += active_ids
+            top_answers = await self.get_top_answers(answer_ids) if answer_ids else {}
+            
+            new_processed = self._process_results(new_questions, top_answers)
+        
+        except (RateLimitedError, aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+            print(f"Error refreshing results: {str(e)}")
+            return None
+        
+        existing_processed = []
+        for question in cached_questions:
+            raw = counters.get(question['id'])
+            if raw is None:
+                existing_processed.append(question)
+                continue
+            updated = {
+                **question,
+                'score': raw['score'],
+                'answer_count': raw['answer_count'],
+                'is_answered': raw['is_answered'],
+                'view_count': raw['view_count'],
+                'last_activity': datetime.fromtimestamp(raw['last_activity_date']).isoformat()
+            }
+            if top_answers.get(question['id']):
+                updated['top_answer'] = top_answers[question['id']]
+            existing_processed.append(updated)
+        
+        merged = self._merge_results(existing_processed, new_processed, sort, order)[:min(pagesize, 100)]
+        return {
+            **cached,
+            'total_results': len(merged),
+            'quota_remaining': data.get('quota_remaining', cached.get('quota_remaining')),
+            'quota_low': self.rate_limiter.quota_low(),
+            'results': merged
+        }, False
+
+    async def _rerank(self,
+                      cached: Dict,
+                      since_epoch: int,
+                      query: str,
+                      tags: Optional[List[str]],
+                      sort: str,
+                      order: str,
+                      pagesize: int) -> Dict:
+        
+        # Relevance ranking is the API's own, so the question search runs again in
+        # full. Top answers are the expensive part; they are fetched only for new
+        # questions and ones active since the entry was stored, the rest keep theirs
+        data = await self._search_questions(query, tags, sort, order, 1, pagesize)
+        if 'error' in data:
+            return data
+        
+        held_answers = {question['id']: question.get('top_answer') for question in cached.get('results', [])}
+        changed = [
+            question for question in data['items']
+            if question['question_id'] not in held_answers or question['last_activity_date'] > since_epoch
+        ]
+        answer_ids = self._answer_lookup_ids(changed)
+        with self.metrics.stage('top_answers', 'stackoverflow'):
+            fetched = await self.get_top_answers(answer_ids) if answer_ids else {}
+        # A lookup that came back empty (quota, errors) keeps the answer already held
+        top_answers = {**held_answers, **{k: v for k, v in fetched.items() if v is not None}}
+        
+        try:
+            processed_results = self._process_results(data['items'], top_answers)
+        except Exception as e:
+            return self._error_response(query, f"Unexpected error: {str(e)}")
+        
+        return self._build_response(query, tags, data, processed_results)
+
+    async def _fetch_question_counters(self, question_ids: List[int]) -> Dict[int, Dict]:
+        
+        # Default filter leaves out bodies, so this stays cheap
+        counters = {}
+        for start in range(0, len(question_ids), self.ids_per_request):
+            batch = question_ids[start:start + self.ids_per_request]
+            data = await self._api_get(
+                f"{self.base_url}/questions/{';'.join(str(i) for i in batch)}",
+                {
+                    'site': 'stackoverflow',
+                    'pagesize': 100,
+                    'key': self.api_key
+                }
+            )
+            for question in data.get('items', []):
+                counters[question['question_id']] = question
+        return counters
+
+    async def _fetch_top_answers(self, questions: List[Dict]) -> Dict[int, Optional[Dict]]:
+        
+        # Only questions with answers need a lookup
+        answered_ids = self._answer_lookup_ids(questions)
+        with self.metrics.stage('top_answers', 'stackoverflow'):
+            return await self.get_top_answers(answered_ids) if answered_ids else {}
+
+    def _run(self, coro: Awaitable, query: str) -> Dict:
+        
+        # The engine's deadline covers the whole search; running out of it is
+        # reported like any other failed request
+        try:
+            return self.engine.run(coro)
+        except asyncio.TimeoutError:
+            error_msg = f"Error making request: no response within {self.engine.default_deadline}s"
+            print(error_msg)
+            return self._error_response(query, error_msg)
+
+    def _merge_results(self, existing: List[Dict], new: List[Dict], sort: str, order: str) -> List[Dict]:
+        
+        return sorted(new + existing, key=INCREMENTAL_SORT_KEYS[sort], reverse=(order == 'desc'))
+
+    async def _search_questions(self,
+                                query: str,
+                                tags: Optional[List[str]],
+                                sort: str,
+                                order: str,
+                                page: int,
+                                pagesize: int) -> Dict:
+        
+        search_url, params = self._search_request(query, tags, sort, order, page, pagesize)
+
+        try:
+            with self.metrics.stage('question_search', 'stackoverflow'):
+                return await self._api_get(search_url, params)
+
+        except RateLimitedError as e:
+            return self._error_response(query, str(e))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # API error messages are carried in the exception by _api_get
+            error_msg = f"Error making request: {str(e) or type(e).__name__}"
+            print(error_msg)
+            return self._error_response(query, error_msg)
+        except Exception as e:
+            error_msg = f"Unexpected error: {str(e)}"
+            print(error_msg)
+            return self._error_response(query, error_msg)
+
+    def _search_request(self,
+                        query: str,
+                        tags: Optional[List[str]],
+                        sort: str,
+                        order: str,
+                        page: int,
+                        pagesize: int) -> Tuple[str, Dict]:
+        
         search_url = f"{self.base_url}/search"
         
 
@@ -102,58 +499,28 @@ class StackOverflowSearcher:
 
         else:
             params['tagged'] = ';'.join(cleaned_query.split(' '))
+        
+        return search_url, params
 
-        try:
-            response = requests.get(
-                search_url,
-                headers=self.headers,
-                params=params
-            )
-            
-            if response.status_code == 429:
-                return {
-                    'error': 'API quota exceeded. Please try again later.',
-                    'query': query,
-                    'results': []
-                }
-
-            response.raise_for_status()
-            data = response.json()
-            
-            processed_results = self._process_results(data['items'])
-            
-            return {
-                'query': query,
-                'tags': tags,
-                'total_results': len(processed_results),
-                'has_more': data.get('has_more', False),
-                'quota_remaining': data.get('quota_remaining'),
-                'results': processed_results
-            }
+    def _build_response(self, query: str, tags: Optional[List[str]], data: Dict, processed_results: List[Dict]) -> Dict:
+        
+        return {
+            'query': query,
+            'tags': tags,
+            'total_results': len(processed_results),
+            'has_more': data.get('has_more', False),
+            'quota_remaining': data.get('quota_remaining'),
+            'quota_low': self.rate_limiter.quota_low(),
+            'results': processed_results
+        }
 
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Error making request: {str(e)}"
-            if hasattr(e, 'response') and e.response is not None:
-                try:
-                    error_details = e.response.json()
-                    if 'error_message' in error_details:
-                        error_msg += f"\nAPI Error: {error_details['error_message']}"
-                except:
-                    pass
-            print(error_msg)
-            return {
-                'error': error_msg,
-                'query': query,
-                'results': []
-            }
-        except Exception as e:
-            error_msg = f"Unexpected error: {str(e)}"
-            print(error_msg)
-            return {
-                'error': error_msg,
-                'query': query,
-                'results': []
-            }
+    def _error_response(self, query: str, error_msg: str) -> Dict:
+        
+        return {
+            'error': error_msg,
+            'query': query,
+            'results': []
+        }
 
     def _clean_query(self, query: str) -> str:
         
@@ -170,16 +537,17 @@ class StackOverflowSearcher:
             
         return cleaned.strip()
 
-    def _process_results(self, questions: List[Dict]) -> List[Dict]:
+    def _process_results(self, questions: List[Dict], top_answers: Dict[int, Optional[Dict]]) -> List[Dict]:
       
         processed_questions = []
         
+        started = time.perf_counter()
         for question in questions:
             created_date = datetime.fromtimestamp(question['creation_date'])
             last_activity_date = datetime.fromtimestamp(question['last_activity_date'])
             
          
-            top_answer = self.get_top_answer(question['question_id'])
+            top_answer = top_answers.get(question['question_id'])
             
             processed_question = {
                 'id': question['question_id'],
@@ -202,6 +570,7 @@ class StackOverflowSearcher:
             
             processed_questions.append(processed_question)
         
+        self.metrics.record_stage('process_results', time.perf_counter() - started, 'stackoverflow')
         return processed_questions
 
 def main():
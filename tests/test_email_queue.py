@@ -0,0 +1,232 @@
+"""EmailQueue delivery over a pooled connection, through smtp_factory fakes and a local SMTP server"""
+import smtplib
+import threading
+import time
+import warnings
+from email.message import EmailMessage
+
+import pytest
+
+from email_queue import EmailQueue
+from benchmarks.search_benchmark import import_app
+
+TERMINAL = ('sent', 'failed')
+
+
+class FakeServer:
+    """Hands out connections; each send takes the next scripted reply (None delivers)"""
+
+    def __init__(self, replies=()):
+        self.replies = list(replies)
+        self.connections = []
+        self.delivered = []
+        self.lock = threading.Lock()
+
+    def connect(self):
+        smtp = FakeSMTP(self)
+        self.connections.append(smtp)
+        return smtp
+
+
+class FakeSMTP:
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+
+    def send_message(self, message):
+        assert not self.closed, 'send on a connection the queue already closed'
+        with self.server.lock:
+            reply = self.server.replies.pop(0) if self.server.replies else None
+        if reply is not None:
+            raise reply
+        self.server.delivered.append((self, message['To']))
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+def message(to):
+    msg = EmailMessage()
+    msg['To'] = to
+    msg['Subject'] = 'Tech Search Results'
+    msg.set_content('results')
+    return msg
+
+
+def wait_for(email_queue, job_id, statuses=TERMINAL, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = email_queue.status(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} still {email_queue.status(job_id)["status"]}')
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(server, connect=None, **kwargs):
+        email_queue = EmailQueue(smtp_factory=connect or server.connect, backoff_seconds=0, idle_seconds=60, **kwargs)
+        queues.append(email_queue)
+        return email_queue
+
+    yield make
+    for email_queue in queues:
+        email_queue.close()
+
+
+def test_messages_share_one_connection(make_queue):
+    server = FakeServer()
+    email_queue = make_queue(server)
+
+    job_ids = [email_queue.submit(message(f'user{i}@example.com')) for i in range(3)]
+    jobs = [wait_for(email_queue, job_id) for job_id in job_ids]
+
+    assert [job['status'] for job in jobs] == ['sent'] * 3
+    assert len(server.connections) == 1
+    assert [smtp for smtp, _ in server.delivered] == [server.connections[0]] * 3
+    assert email_queue.stats()['connections'] == 1
+
+
+def test_reconnects_after_server_disconnect(make_queue):
+    server = FakeServer([None, smtplib.SMTPServerDisconnected('Connection unexpectedly closed')])
+    email_queue = make_queue(server)
+
+    first = wait_for(email_queue, email_queue.submit(message('first@example.com')))
+    second = wait_for(email_queue, email_queue.submit(message('second@example.com')))
+
+    assert first['status'] == 'sent'
+    assert second['status'] == 'sent'
+    assert second['attempts'] == 2
+    assert len(server.connections) == 2
+    assert server.connections[0].closed
+    assert server.delivered[-1] == (server.connections[1], 'second@example.com')
+    assert email_queue.stats()['retries'] == 1
+
+
+def test_permanent_reply_is_not_retried(make_queue):
+    server = FakeServer([smtplib.SMTPDataError(550, b'Mailbox unavailable')])
+    email_queue = make_queue(server, max_attempts=4)
+
+    job = wait_for(email_queue, email_queue.submit(message('gone@example.com')))
+
+    assert job['status'] == 'failed'
+    assert job['attempts'] == 1
+    assert '550' in job['error']
+    assert server.delivered == []
+    stats = email_queue.stats()
+    assert (stats['failed'], stats['retries']) == (1, 0)
+
+
+def test_temporary_reply_is_retried(make_queue):
+    server = FakeServer([smtplib.SMTPDataError(451, b'Try again later')])
+    email_queue = make_queue(server, max_attempts=4)
+
+    job = wait_for(email_queue, email_queue.submit(message('later@example.com')))
+
+    assert job['status'] == 'sent'
+    assert job['attempts'] == 2
+
+
+def test_full_queue_returns_503(make_queue, monkeypatch):
+    app = import_app()
+    release = threading.Event()
+    server = FakeServer()
+
+    def blocking_connect():
+        release.wait(5)
+        return server.connect()
+
+    email_queue = make_queue(server, connect=blocking_connect, max_queue_size=1)
+    monkeypatch.setattr(app, 'email_queue', email_queue)
+    client = app.app.test_client()
+    body = {
+        'email': 'reader@example.com',
+        'query': 'flask',
+        'results': [{'source': 'reddit', 'id': 'abc', 'title': 'Flask tips', 'author': 'someone',
+                     'created_at': '2024-01-01T00:00:00', 'score': 1, 'num_comments': 0, 'upvote_ratio': 1.0}]
+    }
+
+    try:
+        # The worker takes the first message and blocks connecting; the second fills the queue
+        first = client.post('/api/email-results', json=body)
+        assert first.status_code == 202
+        wait_for(email_queue, first.get_json()['job_id'], statuses=('sending',))
+        assert client.post('/api/email-results', json=body).status_code == 202
+
+        rejected = client.post('/api/email-results', json=body)
+        assert rejected.status_code == 503
+        assert 'full' in rejected.get_json()['error']
+    finally:
+        release.set()
+
+    assert wait_for(email_queue, first.get_json()['job_id'])['status'] == 'sent'
+
+
+@pytest.fixture
+def smtp_server():
+    # smtpd and asyncore are deprecated but still the stdlib's only SMTP server
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import asyncore
+        import smtpd
+
+    class RecordingServer(smtpd.SMTPServer):
+        def __init__(self):
+            super().__init__(('127.0.0.1', 0), None)
+            self.port = self.socket.getsockname()[1]
+            self.sessions = 0
+            self.received = []
+
+        def handle_accepted(self, conn, addr):
+            self.sessions += 1
+            super().handle_accepted(conn, addr)
+
+        def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+            self.received.append((mailfrom, rcpttos))
+
+    server = RecordingServer()
+    stopping = threading.Event()
+
+    def serve():
+        while not stopping.is_set():
+            asyncore.loop(timeout=0.05, count=1)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield server
+    stopping.set()
+    thread.join(5)
+    asyncore.close_all()
+
+
+def test_delivers_over_one_real_smtp_session(smtp_server):
+    email_queue = EmailQueue(
+        host='127.0.0.1',
+        port=smtp_server.port,
+        use_ssl=False,
+        username=None,
+        backoff_seconds=0,
+        idle_seconds=60
+    )
+    try:
+        jobs = []
+        for to in ('first@example.com', 'second@example.com'):
+            msg = message(to)
+            msg['From'] = 'search@example.com'
+            jobs.append(wait_for(email_queue, email_queue.submit(msg)))
+    finally:
+        email_queue.close()
+
+    assert [job['status'] for job in jobs] == ['sent', 'sent']
+    assert smtp_server.sessions == 1
+    assert smtp_server.received == [
+        ('search@example.com', ['first@example.com']),
+        ('search@example.com', ['second@example.com'])
+    ]
+    assert email_queue.stats()['connections'] == 1
@@ -0,0 +1,77 @@
+"""Cold start with MongoDB unreachable: the import and the first search stay fast and still answer"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.fake_upstreams import FakeReddit, FakeStackExchange
+from benchmarks.search_benchmark import benchmark_env
+from tests.conftest import ROOT
+
+# Generous for CI machines; a connection attempt at import would cost the full
+# server selection timeout (or hang) and blow well past it
+IMPORT_BUDGET_SECONDS = 3.0
+
+MONGO_TIMEOUT_MS = 300
+# The first search may wait out the MongoDB connection timeout but must not
+# hang on it; the margin covers two fake upstreams and Flask warm-up
+FIRST_SEARCH_BUDGET_SECONDS = MONGO_TIMEOUT_MS / 1000 + 1.0
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+import_seconds = time.perf_counter() - started
+
+client = app.app.test_client()
+started = time.perf_counter()
+response = client.get('/api/search?q=degraded+start')
+search_seconds = time.perf_counter() - started
+stats = client.get('/api/cache/stats').get_json()
+print(json.dumps({
+    'import_seconds': import_seconds,
+    'search_seconds': search_seconds,
+    'status': response.status_code,
+    'body': response.get_json(),
+    'mongo_state': stats['mongo']['state']
+}))
+"""
+
+
+@pytest.fixture
+def upstreams():
+    reddit, stackexchange = FakeReddit(latency_ms=5, jitter_ms=0), FakeStackExchange(latency_ms=5, jitter_ms=0)
+    urls = reddit.start(), stackexchange.start()
+    yield urls
+    reddit.stop()
+    stackexchange.stop()
+
+
+def test_import_and_first_search_with_mongo_unreachable(upstreams):
+    env = {
+        **os.environ,
+        **benchmark_env(*upstreams),
+        # Nothing listens on the discard port, so every connection is refused
+        'MONGO_URL': 'mongodb://127.0.0.1:9/?connectTimeoutMS=200',
+        'MONGO_TIMEOUT_MS': str(MONGO_TIMEOUT_MS)
+    }
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    assert completed.returncode == 0, completed.stderr
+    probe = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    assert probe['import_seconds'] < IMPORT_BUDGET_SECONDS
+    assert probe['search_seconds'] < FIRST_SEARCH_BUDGET_SECONDS
+    assert probe['status'] == 200
+    assert probe['body']['errors'] == []
+    assert probe['body']['reddit']['results']
+    assert probe['body']['stackoverflow']['results']
+    assert probe['mongo_state'] == 'unavailable'